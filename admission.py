@@ -0,0 +1,111 @@
+"""
+admission control ของงานวิเคราะห์ภาพ: จำกัดงานที่ทำพร้อมกัน/รอคิว และดู deadline ของ reply token
+
+- ADMISSION_MAX_INFLIGHT จำกัดเฉพาะช่วง inference (semaphore รอบ predict_images)
+  worker ของ lane "image" (IMAGE_WORKERS) มีมากกว่านั้น เพื่อให้ดาวน์โหลดรูป/ส่ง reply ซ้อนกับงานโมเดลได้
+- คิวเต็ม (ADMISSION_MAX_QUEUE) -> ตอบ "ระบบไม่ว่าง" ทันที
+- ก่อนเริ่มงาน ถ้าคาดว่าจะเสร็จหลัง reply token หมดอายุ -> ตอบ "ระบบไม่ว่าง" แทน (ไม่เสียเวลาโมเดล)
+- reply token หมดอายุไปแล้ว -> ข้ามไปเลย (ตอบไม่ได้อยู่ดี)
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# ค่าเริ่มต้น = ML_MAX_BATCH_SIZE ภาพเดี่ยวที่เข้ามาพร้อมกันจึงรวมเป็น batch เต็มได้
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", os.getenv("ML_MAX_BATCH_SIZE", "8")))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(2 * ADMISSION_MAX_INFLIGHT)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# อายุของ reply token (วินาที) นับจาก timestamp ของ event และเวลาเผื่อสำหรับส่ง reply
+REPLY_TOKEN_TTL = float(os.getenv("REPLY_TOKEN_TTL", "60"))
+ADMISSION_SAFETY_MARGIN = float(os.getenv("ADMISSION_SAFETY_MARGIN", "2"))
+
+ADMIT = "admit"
+SHED = "shed"
+EXPIRED = "expired"
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        reply_ttl: float = REPLY_TOKEN_TTL,
+        safety_margin: float = ADMISSION_SAFETY_MARGIN,
+        initial_service_time: float = 2.0,
+        alpha: float = 0.2,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+    ):
+        self.reply_ttl = reply_ttl
+        self.safety_margin = safety_margin
+        self.alpha = alpha
+        self._service_time = initial_service_time
+        self._lock = threading.Lock()
+        self._inference = threading.BoundedSemaphore(max(1, int(max_inflight)))
+
+        self.admitted = 0
+        self.completed = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+        self.deadline_missed = 0
+        self.late_replies = 0
+        self.inflight = 0
+
+    def deadline(self, event) -> float:
+        """เวลา (epoch) สุดท้ายที่ยังควรส่ง reply ได้"""
+        ts = getattr(event, "timestamp", None)
+        received = ts / 1000.0 if ts else time.time()
+        return received + self.reply_ttl - self.safety_margin
+
+    def expected_service_time(self) -> float:
+        return self._service_time
+
+    def check(self, event) -> str:
+        """เรียกตอน worker หยิบงาน: ADMIT / SHED (ตอบไม่ว่าง) / EXPIRED (ข้าม)"""
+        now = time.time()
+        deadline = self.deadline(event)
+        with self._lock:
+            if now >= deadline:
+                self.deadline_missed += 1
+                return EXPIRED
+            if now + self._service_time > deadline:
+                self.shed_deadline += 1
+                return SHED
+            self.admitted += 1
+            return ADMIT
+
+    @contextmanager
+    def inference(self):
+        """ช่อง inference: งานที่ส่งภาพเข้าโมเดลพร้อมกันไม่เกิน max_inflight"""
+        with self._inference:
+            with self._lock:
+                self.inflight += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.inflight -= 1
+
+    def reject(self):
+        """คิวเต็มตอนรับ event"""
+        with self._lock:
+            self.shed_queue_full += 1
+
+    def done(self, event, seconds: float):
+        """บันทึกเวลาที่ใช้จริง (EWMA) และนับ reply ที่เลย deadline"""
+        with self._lock:
+            self.completed += 1
+            self._service_time = (1 - self.alpha) * self._service_time + self.alpha * seconds
+            if time.time() > self.deadline(event) + self.safety_margin:
+                self.late_replies += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "completed": self.completed,
+                "shed_queue_full": self.shed_queue_full,
+                "shed_deadline": self.shed_deadline,
+                "deadline_missed": self.deadline_missed,
+                "late_replies": self.late_replies,
+                "inflight": self.inflight,
+                "expected_service_seconds": self._service_time,
+            }
@@ -1,15 +1,88 @@
-from flask import Flask, request, jsonify
+import hmac
+import json
+import os
+import shutil
+import tempfile
+
+from flask import Flask, Response, request, jsonify
+
+import ml_model
+from bulk_diagnosis import default_workers, diagnose_stream, iter_uploads, open_source
 
 app = Flask(__name__)
 
-@app.route("/webhook", methods=["POST"])
-def predict():
-    data = request.json
-    user_message = data.get("input", "")
-    response = f"คุณกล่าวว่า: {user_message}"
-    return jsonify({"output": response})
+# โฟลเดอร์/zip บนเซิร์ฟเวอร์ที่อนุญาตให้สั่งวิเคราะห์ผ่าน {"path": ...} (ว่าง = ปิด)
+BULK_ROOT = os.getenv("BULK_ROOT", "")
+# token ของ /bulk (ส่งใน header X-Admin-Token เหมือน /admin/* ของ main.py) ว่าง = ปิด endpoint
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+ml_model.start_model_loading()
+
+
+def _server_source(path: str):
+    if not BULK_ROOT:
+        return None
+    root = os.path.realpath(BULK_ROOT)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root or not os.path.exists(full):
+        return None
+    return open_source(full)
+
+
+def _authorized() -> bool:
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
 
-if __name__ == "__main__":
-    app.run(port=8000)
 
+def _spool_uploads(files):
+    """
+    คัดลอกไฟล์ที่ upload ลง temp file ก่อน เพราะ Flask ปิด stream ของ upload ตอน request จบ
+    ซึ่งเกิดก่อน generate() จะอ่านไฟล์ (temp file ถูกลบเองเมื่อปิด)
+    """
+    uploads = []
+    for i, f in enumerate(files):
+        tmp = tempfile.TemporaryFile()
+        shutil.copyfileobj(f.stream, tmp)
+        tmp.seek(0)
+        uploads.append((f.filename or f"file{i}", tmp))
+    return uploads
 
+
+@app.route("/bulk", methods=["POST"])
+def bulk():
+    """
+    วิเคราะห์ภาพหลายภาพ ตอบกลับเป็น JSONL ทีละบรรทัด (stream)
+    - multipart: ไฟล์ภาพหรือ zip หลายไฟล์ในฟิลด์ "files"
+    - JSON: {"path": "<โฟลเดอร์หรือ zip ใต้ BULK_ROOT>", "skip": ["ชื่อที่ทำแล้ว", ...]}
+    ต้องส่ง header X-Admin-Token ภาพ (หรือไฟล์ใน zip) ที่ใหญ่เกิน BULK_MAX_FILE_BYTES ได้ record error
+    """
+    if not _authorized():
+        return jsonify({"error": "forbidden"}), 403
+    if not ml_model.MODEL_READY:
+        return jsonify(ml_model.get_model_state()), 503
+
+    skip = set()
+    uploads = []
+    if request.files:
+        uploads = _spool_uploads(request.files.getlist("files"))
+        sources = iter_uploads(uploads)
+    else:
+        data = request.get_json(silent=True) or {}
+        sources = _server_source(data.get("path", ""))
+        if sources is None:
+            return jsonify({"error": "path not found or not allowed"}), 400
+        skip = set(data.get("skip", []))
+
+    def generate():
+        try:
+            for record in diagnose_stream(sources, workers=default_workers(), skip=skip):
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        finally:
+            for _, tmp in uploads:
+                tmp.close()
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    app.run(port=8000, threaded=True)
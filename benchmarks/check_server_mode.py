@@ -0,0 +1,125 @@
+"""
+ตรวจเส้นทาง ML_INFERENCE_MODE=server แบบครบวง ไม่ต้องมีไฟล์โมเดล/tensorflow
+
+เปิด inference worker จำลอง (โมเดลปลอมที่ตอบตามค่าเฉลี่ยสีของภาพ) บน Unix socket ชั่วคราว
+แล้วให้ ml_model ต่อผ่าน RemoteEngine จริง และเรียก predict_images / predict_image
+ทุกภาพต้องได้ ok=True และผลตรงกับการเรียกโมเดลปลอมตรง ๆ
+
+ตัวอย่าง:
+    python -m benchmarks.check_server_mode --images 6
+"""
+import argparse
+import os
+import sys
+import subprocess
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import numpy as np
+
+NUM_CLASSES = 7
+
+
+class _StubEngine:
+    """แทน MicroBatcher ฝั่ง inference worker: รับภาพ uint8 1 ภาพ คืน probability ของ 7 class"""
+
+    def __init__(self):
+        self.requests = 0
+
+    def predict(self, x):
+        self.requests += 1
+        return stub_probs(x)
+
+    def stats(self):
+        return {"requests": self.requests}
+
+
+def stub_probs(x):
+    class_id = int(np.asarray(x, dtype=np.float32).mean()) % NUM_CLASSES
+    probs = np.full(NUM_CLASSES, 0.05, dtype=np.float32)
+    probs[class_id] = 1.0 - 0.05 * (NUM_CLASSES - 1)
+    return probs
+
+
+def _serve(address, authkey: bytes):
+    """inference worker จำลอง (รันเป็น process แยกเหมือน inference_server.py)"""
+    import inference_server
+
+    engine = _StubEngine()
+    listener = Listener(address, authkey=authkey)
+    info = {"worker": 0, "pid": os.getpid(), "version": "stub:1"}
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            return
+        threading.Thread(
+            target=inference_server._serve_connection, args=(conn, engine, info), daemon=True
+        ).start()
+
+
+def run(count: int) -> int:
+    tmp = tempfile.mkdtemp(prefix="chillibot-check-")
+    address = os.path.join(tmp, "worker-0.sock")
+    authkey = os.urandom(16).hex()
+
+    # ml_model / inference_server อ่าน env ตอน import
+    os.environ["ML_INFERENCE_MODE"] = "server"
+    os.environ["ML_INFERENCE_ADDRESSES"] = address
+    os.environ["ML_INFERENCE_AUTHKEY"] = authkey
+    os.environ["ML_INFERENCE_CONNECT_TIMEOUT"] = "10"
+    os.environ["PRED_CACHE_SIZE"] = "0"
+    os.environ["ML_SCREEN_MODEL_PATH"] = ""
+    os.environ["ML_REGISTRY_DIR"] = ""
+
+    import ml_model
+    from benchmarks.mock_line_api import synthetic_images
+
+    worker = subprocess.Popen([sys.executable, "-m", "benchmarks.check_server_mode", "--serve", address])
+    while not os.path.exists(address) and worker.poll() is None:
+        time.sleep(0.05)
+
+    failures = []
+    try:
+        ml_model.load_ml_model()
+        state = ml_model.get_model_state()
+        if state["state"] != ml_model.STATE_READY:
+            print(f"[CHECK] model state is {state['state']} ({state['error']})")
+            return 1
+
+        images = synthetic_images(count, seed=11)
+        results = ml_model.predict_images(images) + [ml_model.predict_image(images[0])]
+        for i, (data, res) in enumerate(zip(images + images[:1], results)):
+            expected = int(np.argmax(stub_probs(ml_model._preprocess_image(data))))
+            if not res["ok"] or res["class_id"] != expected:
+                failures.append((i, res["ok"], res["class_id"], expected))
+        stats = ml_model.engine.stats()
+        print(f"[CHECK] {len(results)} predictions via {stats['mode']} "
+              f"(requests={stats['requests']}, errors={stats['errors']})")
+    finally:
+        if ml_model.engine is not None:
+            ml_model.engine.close()
+        worker.terminate()
+        worker.wait(timeout=5)
+
+    for i, ok, got, expected in failures:
+        print(f"[CHECK] image {i}: ok={ok} class_id={got} expected={expected}")
+    print("[CHECK] server mode " + ("FAILED" if failures else "OK"))
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="End-to-end check of ML_INFERENCE_MODE=server")
+    ap.add_argument("--images", type=int, default=6)
+    ap.add_argument("--serve", metavar="ADDRESS", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.serve:
+        _serve(args.serve, os.environ["ML_INFERENCE_AUTHKEY"].encode("utf-8"))
+        return 0
+    return run(max(1, args.images))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
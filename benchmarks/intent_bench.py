@@ -0,0 +1,140 @@
+"""
+throughput ของ text intent engine (text_intent.py) บนชุดคำถามตัวอย่าง ไม่ต้องใช้ server/เน็ต
+
+ตัวอย่าง:
+    python -m benchmarks.intent_bench --iterations 20000
+    python -m benchmarks.intent_bench --show --out intent.json
+
+คำถามแต่ละข้อมี intent / class_id ที่คาดไว้ จึงรายงานความถูกต้องควบคู่กับเวลา
+"""
+import argparse
+import json
+import sys
+import time
+
+from benchmarks.run_bench import percentiles
+from ml_model import DISEASE_INFO
+from text_intent import IntentEngine
+
+# (คำถาม, intent ที่คาด, class_id ที่คาด หรือ None)
+SAMPLE_CORPUS = [
+    ("ใบพริกมีจุดสีน้ำตาล ทำยังไงดี", "disease", 0),
+    ("ใบจุดเป็นวงแหวนซ้อนกัน", "disease", 0),
+    ("ใบพริกเป็นจุดไหม้ ๆ ใบร่วง", "disease", 0),
+    ("ขอบใบไหม้ ผลแห้ง", "disease", 1),
+    ("อาการกุ้งแห้งเป็นยังไง", "disease", 1),
+    ("พริกเป็นกุ้งแห้ง รักษายังไง", "disease", 1),
+    ("ผลพริกเน่า มีจุดสีส้ม", "disease", 2),
+    ("แผลบุ๋มสีดำบนผลพริก", "disease", 2),
+    ("แอนแทรคโนสรักษายังไง", "disease", 2),
+    ("ราแป้งขาวบนใบพริก", "disease", 3),
+    ("ใบมีผงสีขาวเหมือนแป้ง", "disease", 3),
+    ("ราแปง ป้องกันยังไง", "disease", 3),
+    ("โคนต้นเน่า ใบเหี่ยว", "disease", 4),
+    ("รากเน่า ดินแฉะ ทำไงดี", "disease", 4),
+    ("ไตรโคเดอร์มาใช้กับโคนเน่าได้ไหม", "disease", 4),
+    ("ใบด่างเขียวเหลือง มีเพลี้ยอ่อน", "disease", 5),
+    ("ใบด่าง ต้นแคระ", "disease", 5),
+    ("ใบหงิก เหลือง มีแมลงหวี่ขาว", "disease", 6),
+    ("ใบม้วนงอ ยอดหงิก", "disease", 6),
+    ("leaf curl virus", "disease", 6),
+    ("สวัสดีค่ะ", "greeting", None),
+    ("หวัดดีครับ", "greeting", None),
+    ("ขอบคุณมากค่ะ", "thanks", None),
+    ("ใช้ยังไง", "help", None),
+    ("วันนี้อากาศดี", "unknown", None),
+    ("ราคาพริกวันนี้เท่าไหร่", "unknown", None),
+]
+
+# คำถามนอกเรื่องโรคที่ไม่ได้ใช้ตอนเลือกคำศัพท์ใน text_intent.py (ห้ามเพิ่มคำจากชุดนี้ลงพจนานุกรม)
+# ใช้วัดว่าบอทไม่เดาโรคให้คำถามทั่วไปที่มีคำอย่าง พริก / ใบ / ผล / ฝน
+HELDOUT_NEGATIVES = [
+    "พรุ่งนี้ฝนจะตกไหม",
+    "ปลูกพริกกี่วันถึงเก็บผลได้",
+    "ใส่ปุ๋ยพริกช่วงไหนดี",
+    "รดน้ำต้นพริกวันละกี่ครั้ง",
+    "พริกขี้หนูกับพริกชี้ฟ้าต่างกันยังไง",
+    "เมล็ดพันธุ์พริกหาซื้อได้ที่ไหน",
+    "ขอสูตรน้ำพริกเผาหน่อย",
+    "ต้นพริกโตเต็มที่สูงประมาณกี่เมตร",
+    "เก็บผลพริกตอนเช้าหรือตอนเย็นดี",
+    "ดินแบบไหนเหมาะกับปลูกพริก",
+    "ย้ายกล้าพริกลงแปลงตอนไหน",
+    "ราวตากผ้าพังทำยังไง",
+    "ฤดูฝนปีนี้เริ่มเมื่อไร",
+    "ใบกะเพราใส่ผัดพริกได้ไหม",
+    "ตลาดรับซื้อพริกแถวบ้านมีไหม",
+]
+
+
+def run(iterations: int):
+    t0 = time.perf_counter()
+    engine = IntentEngine(DISEASE_INFO)
+    build_seconds = time.perf_counter() - t0
+
+    correct = 0
+    rows = []
+    for text, intent, class_id in SAMPLE_CORPUS:
+        m = engine.match(text)
+        ok = m.intent == intent and (class_id is None or m.class_id == class_id)
+        correct += ok
+        rows.append({"text": text, "intent": m.intent, "class_id": m.class_id,
+                     "score": round(m.score, 3), "expected": [intent, class_id], "ok": ok})
+
+    rejected = 0
+    for text in HELDOUT_NEGATIVES:
+        m = engine.match(text)
+        ok = m.intent != "disease"
+        rejected += ok
+        rows.append({"text": text, "intent": m.intent, "class_id": m.class_id,
+                     "score": round(m.score, 3), "expected": ["not disease", None], "ok": ok,
+                     "heldout": True})
+
+    texts = [text for text, _, _ in SAMPLE_CORPUS]
+    latencies = []
+    t0 = time.perf_counter()
+    for i in range(iterations):
+        s = time.perf_counter()
+        engine.respond(texts[i % len(texts)])
+        latencies.append(time.perf_counter() - s)
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "build_ms": build_seconds * 1000.0,
+        "index": engine.index_stats(),
+        "accuracy": correct / len(SAMPLE_CORPUS),
+        "heldout_rejection": rejected / len(HELDOUT_NEGATIVES),
+        "iterations": iterations,
+        "throughput_qps": iterations / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+        "samples": rows,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Throughput benchmark for the text intent engine")
+    ap.add_argument("--iterations", type=int, default=20000)
+    ap.add_argument("--show", action="store_true", help="print the match for every sample question")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args(argv)
+
+    result = run(args.iterations)
+    if args.show:
+        for r in result["samples"]:
+            mark = "ok " if r["ok"] else "BAD"
+            print(f"{mark} {r['intent']:<8} {str(r['class_id']):<4} {r['score']:.3f}  {r['text']}")
+    lat = result["latency"]
+    print(f"[INTENT] index {result['index']} built in {result['build_ms']:.1f} ms")
+    print(f"[INTENT] accuracy {result['accuracy'] * 100:.1f}% on {len(SAMPLE_CORPUS)} sample questions")
+    print(f"[INTENT] held-out off-topic not diagnosed: {result['heldout_rejection'] * 100:.1f}% "
+          f"of {len(HELDOUT_NEGATIVES)}")
+    print(f"[INTENT] {result['throughput_qps']:.0f} q/s, mean {lat['mean_ms'] * 1000:.1f} us, "
+          f"p50 {lat['p50_ms'] * 1000:.1f} us, p99 {lat['p99_ms'] * 1000:.1f} us")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
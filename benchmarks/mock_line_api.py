@@ -0,0 +1,148 @@
+"""
+mock ของ LINE Messaging API + Blob API สำหรับ benchmark (ไม่ต้องใช้เน็ต)
+
+- GET  /v2/bot/message/{id}/content : คืนภาพตัวอย่าง (วนตาม message id)
+- POST /v2/bot/message/reply        : บันทึกข้อความตอบกลับพร้อมเวลา
+- GET  /_mock/replies               : ดูข้อความที่บันทึกไว้ (debug)
+
+ชี้ main.py มาที่ mock ด้วย LINE_API_HOST / LINE_DATA_API_HOST
+"""
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+CONTENT_RE = re.compile(r"^/v2/bot/message/([^/]+)/content$")
+
+
+def synthetic_images(count: int = 8, size=(1280, 960), seed: int = 7):
+    """ภาพ JPEG สังเคราะห์ขนาดใกล้ภาพจากมือถือ (ใช้เมื่อไม่มีโฟลเดอร์ภาพพริกจริง)"""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        base = (rng.randint(20, 90), rng.randint(90, 180), rng.randint(20, 80))
+        img = Image.new("RGB", size, base)
+        noise = Image.effect_noise(size, rng.randint(20, 60)).convert("RGB")
+        img = Image.blend(img, noise, 0.3)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=88)
+        images.append(buf.getvalue())
+    return images
+
+
+def load_images(folder: str, limit: int = 64):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTS):
+            with open(os.path.join(folder, name), "rb") as f:
+                images.append(f.read())
+        if len(images) >= limit:
+            break
+    return images
+
+
+class MockLineAPI:
+    def __init__(self, images, host: str = "127.0.0.1", port: int = 0):
+        if not images:
+            raise ValueError("MockLineAPI needs at least one image")
+        self.images = images
+        self._lock = threading.Lock()
+        self.replies = []
+        self.blob_requests = {}
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # header กับ body ถูกเขียนแยกกัน: ปิด Nagle ไม่งั้นโดน delayed ACK ~40ms ต่อ request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                m = CONTENT_RE.match(self.path)
+                if m:
+                    message_id = m.group(1)
+                    mock._record_blob(message_id)
+                    data = mock.images[zlib.crc32(message_id.encode()) % len(mock.images)]
+                    return self._send(200, data, "image/jpeg")
+                if self.path == "/_mock/replies":
+                    with mock._lock:
+                        body = json.dumps(mock.replies, ensure_ascii=False).encode("utf-8")
+                    return self._send(200, body, "application/json")
+                self._send(404, b"{}", "application/json")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/v2/bot/message/reply":
+                    mock._record_reply(payload)
+                    sent = [{"id": str(i), "quoteToken": "q"} for i, _ in enumerate(payload.get("messages", []))]
+                    body = json.dumps({"sentMessages": sent or [{"id": "0"}]}).encode("utf-8")
+                    return self._send(200, body, "application/json")
+                self._send(200, b"{}", "application/json")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _record_blob(self, message_id: str):
+        with self._lock:
+            self.blob_requests.setdefault(message_id, time.perf_counter())
+
+    def _record_reply(self, payload: dict):
+        with self._lock:
+            self.replies.append(
+                {
+                    "reply_token": payload.get("replyToken"),
+                    "messages": payload.get("messages", []),
+                    "t": time.perf_counter(),
+                }
+            )
+
+    def reply_times(self) -> dict:
+        with self._lock:
+            return {r["reply_token"]: r["t"] for r in self.replies}
+
+    def reply_texts(self) -> dict:
+        """{reply token: [ข้อความ text ทุกอันใน reply]}"""
+        with self._lock:
+            return {
+                r["reply_token"]: [m.get("text", "") for m in r["messages"] if m.get("type") == "text"]
+                for r in self.replies
+            }
+
+    def reset(self):
+        with self._lock:
+            self.replies.clear()
+            self.blob_requests.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-line", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
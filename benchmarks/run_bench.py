@@ -0,0 +1,362 @@
+"""
+load test แบบ end-to-end: uvicorn main:app + mock LINE API บนเครื่องเดียวกัน (ไม่ใช้เน็ต)
+
+ตัวอย่าง:
+    python -m benchmarks.run_bench --scenario image --requests 200 --concurrency 16
+    python -m benchmarks.run_bench --scenario burst --burst-size 5 --out bench.json
+
+stage ที่วัด (ต่อ event):
+    ack        : ส่ง webhook -> ได้ 200
+    to_blob    : ส่ง webhook -> server มาดึงภาพจาก Blob API
+    process    : ดึงภาพ -> ส่ง reply (ดาวน์โหลด + วิเคราะห์ + ตอบกลับ)
+    end_to_end : ส่ง webhook -> mock ได้รับ reply
+
+ค่าเริ่มต้นใช้ ML_BACKEND=fake (โมเดลจำลอง ไม่ต้องมีไฟล์โมเดล) เพื่อให้ภาพผ่าน predict_image จริง
+ถ้าโมเดลไม่พร้อม scenario ที่มีภาพจะล้มทันที และ reply ของภาพที่ไม่ใช่ผลวิเคราะห์นับเป็น error
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.mock_line_api import MockLineAPI, load_images, synthetic_images
+from benchmarks.webhook_payloads import burst_events, image_event, signed_request, text_event
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHANNEL_SECRET = "bench-channel-secret"
+CHANNEL_TOKEN = "bench-channel-token"
+
+SAMPLE_QUESTIONS = [
+    "ใบพริกมีจุดสีน้ำตาล ทำยังไงดี",
+    "ผลพริกเน่า มีจุดสีส้ม",
+    "ใบหงิก เหลือง มีแมลงหวี่ขาว",
+    "ราแป้งขาวบนใบพริก",
+    "โคนต้นเน่า ใบเหี่ยว",
+]
+
+# reply ของภาพที่เป็นผลวิเคราะห์สำเร็จ / ตอบ "ระบบไม่ว่าง" (admission control) ตาม main.py
+RESULT_PREFIX = "🔍"
+BUSY_MARKER = "มีผู้ส่งรูปเข้ามาจำนวนมาก"
+
+
+def percentiles(values):
+    """สรุปเวลา (วินาที) เป็นมิลลิวินาที"""
+    if not values:
+        return {"count": 0}
+    xs = sorted(values)
+
+    def pick(q):
+        if len(xs) == 1:
+            return xs[0]
+        pos = q * (len(xs) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(xs) - 1)
+        return xs[lo] + (xs[hi] - xs[lo]) * (pos - lo)
+
+    return {
+        "count": len(xs),
+        "mean_ms": sum(xs) / len(xs) * 1000.0,
+        "p50_ms": pick(0.50) * 1000.0,
+        "p95_ms": pick(0.95) * 1000.0,
+        "p99_ms": pick(0.99) * 1000.0,
+        "max_ms": xs[-1] * 1000.0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid: int):
+    """VmHWM ของ process (Linux) เป็น MB"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def build_requests(scenario: str, count: int, burst_size: int):
+    """คืน list ของ events ต่อ 1 webhook request"""
+    batches = []
+    for i in range(count):
+        user = f"Ubench{i % 50:04d}"
+        kind = scenario
+        if scenario == "mixed":
+            kind = ("text", "image", "text", "burst")[i % 4]
+        if kind == "text":
+            batches.append([text_event(SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)], user)])
+        elif kind == "image":
+            batches.append([image_event(user)])
+        else:
+            batches.append(burst_events(burst_size, user))
+    return batches
+
+
+def event_group(event):
+    """
+    key ที่ server อาจใช้รวมภาพเป็นกลุ่มเดียว (ตอบครั้งเดียวด้วย reply token ของภาพใดภาพหนึ่ง):
+    imageSet id ถ้ามี ไม่งั้นผู้ใช้ ข้อความตอบด้วย token ของตัวเองเสมอ
+    """
+    message = event["message"]
+    if message["type"] != "image":
+        return None
+    image_set = message.get("imageSet")
+    if image_set:
+        return "set:" + image_set["id"]
+    return "user:" + event["source"]["userId"]
+
+
+def match_replies(sent: dict, replies: dict) -> dict:
+    """
+    คืน {reply token: (เวลาที่ event นั้นได้คำตอบ, reply token ของ reply นั้น)}
+    ภาพที่ถูกรวมกลุ่มถือว่าได้คำตอบเมื่อมี reply ของกลุ่มเดียวกันที่ส่งหลังภาพนั้น
+    """
+    group_replies = {}
+    for token, (_, _, _, group) in sent.items():
+        if group is not None and token in replies:
+            group_replies.setdefault(group, []).append((replies[token], token))
+
+    answered = {}
+    for token, (t0, _, _, group) in sent.items():
+        if token in replies:
+            answered[token] = (replies[token], token)
+        elif group is not None:
+            hit = min((r for r in group_replies.get(group, ()) if r[0] >= t0), default=None)
+            if hit is not None:
+                answered[token] = hit
+    return answered
+
+
+def reply_outcome(message_type: str, texts) -> str:
+    """ok / busy / failed ของ reply (ข้อความตอบได้ทุกแบบ ภาพต้องได้ผลวิเคราะห์)"""
+    if message_type != "image":
+        return "ok"
+    if any(t.startswith(RESULT_PREFIX) for t in texts):
+        return "ok"
+    if any(BUSY_MARKER in t for t in texts):
+        return "busy"
+    return "failed"
+
+
+class Server:
+    def __init__(self, port: int, env: dict):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        cmd = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ]
+        self.proc = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+
+    def wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            try:
+                r = requests.get(self.url + "/ready", timeout=2)
+                state = r.json().get("state")
+                if r.status_code == 200 or state == "failed":
+                    return state
+            except (requests.RequestException, ValueError):
+                pass
+            time.sleep(0.2)
+        raise TimeoutError("server did not become ready")
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def run(args) -> dict:
+    images = load_images(args.images) if args.images else synthetic_images()
+    mock = MockLineAPI(images).start()
+
+    env = dict(os.environ)
+    env.update(
+        {
+            "LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+            "LINE_CHANNEL_ACCESS_TOKEN": CHANNEL_TOKEN,
+            "LINE_API_HOST": mock.url,
+            "LINE_DATA_API_HOST": mock.url,
+            "ML_MODEL_URL": args.model_url,
+            "ML_BACKEND": args.backend or ("keras" if args.model_url else "fake"),
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    server = Server(args.port or free_port(), env)
+    try:
+        t_boot = time.perf_counter()
+        model_state = server.wait_ready(args.ready_timeout)
+        boot_seconds = time.perf_counter() - t_boot
+        if args.scenario != "text" and model_state != "ready":
+            raise RuntimeError(f"model is not ready (state={model_state}), image results would be NO-ML replies")
+
+        batches = build_requests(args.scenario, args.requests, args.burst_size)
+        sent = {}
+        acks = []
+        errors = {"http": 0, "exception": 0}
+        lock = threading.Lock()
+        local = threading.local()
+
+        def send(events):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            body, headers = signed_request(events, CHANNEL_SECRET)
+            t0 = time.perf_counter()
+            try:
+                r = local.session.post(server.url + "/webhook", data=body, headers=headers, timeout=30)
+                t1 = time.perf_counter()
+            except requests.RequestException:
+                with lock:
+                    errors["exception"] += 1
+                return
+            with lock:
+                acks.append(t1 - t0)
+                if r.status_code != 200:
+                    errors["http"] += 1
+                    return
+                for e in events:
+                    sent[e["replyToken"]] = (t0, e["message"]["id"], e["message"]["type"], event_group(e))
+
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(send, batches))
+        t_sent = time.perf_counter()
+
+        # รอ reply ให้ครบ (หรือหมดเวลา)
+        deadline = time.monotonic() + args.reply_timeout
+        while time.monotonic() < deadline:
+            if len(match_replies(sent, mock.reply_times())) >= len(sent):
+                break
+            time.sleep(0.05)
+        t_done = time.perf_counter()
+
+        rss = peak_rss_mb(server.proc.pid)
+    finally:
+        server.stop()
+        mock.stop()
+
+    replies = mock.reply_times()
+    texts = mock.reply_texts()
+    matched = match_replies(sent, replies)
+    stages = {"to_blob": [], "process": [], "end_to_end": []}
+    outcomes = {"ok": 0, "busy": 0, "failed": 0}
+    answered = 0
+    for token, (t0, message_id, message_type, _) in sent.items():
+        if token not in matched:
+            continue
+        t_reply, reply_token = matched[token]
+        answered += 1
+        outcomes[reply_outcome(message_type, texts.get(reply_token, []))] += 1
+        stages["end_to_end"].append(t_reply - t0)
+        t_blob = mock.blob_requests.get(message_id)
+        if t_blob is not None:
+            stages["to_blob"].append(t_blob - t0)
+            stages["process"].append(t_reply - t_blob)
+
+    total_events = sum(len(b) for b in batches)
+    unanswered = len(sent) - answered
+    elapsed = t_done - t_start
+    return {
+        "config": {
+            "scenario": args.scenario,
+            "requests": args.requests,
+            "events": total_events,
+            "concurrency": args.concurrency,
+            "burst_size": args.burst_size,
+            "images": len(images),
+            "env": args.env,
+        },
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "model_state": model_state,
+        "boot_seconds": boot_seconds,
+        "requests_per_sec": args.requests / (t_sent - t_start) if t_sent > t_start else 0.0,
+        "events_per_sec": answered / elapsed if elapsed > 0 else 0.0,
+        "latency": {"ack": percentiles(acks), **{k: percentiles(v) for k, v in stages.items()}},
+        "peak_rss_mb": rss,
+        # จำนวน reply ที่ส่งออกจริง (น้อยกว่า events เมื่อ server รวมภาพเป็นกลุ่ม)
+        "replies": len(set(replies) & set(sent)),
+        # busy = ตอบ "ระบบไม่ว่าง" ตาม admission control (ตั้งใจ ไม่นับเป็น error)
+        "busy": outcomes["busy"],
+        "errors": {
+            **errors,
+            "unanswered": unanswered,
+            "failed_replies": outcomes["failed"],
+            "error_rate": (
+                (errors["http"] + errors["exception"] + unanswered + outcomes["failed"]) / total_events
+                if total_events else 0.0
+            ),
+        },
+    }
+
+
+def print_summary(result: dict):
+    print(f"scenario={result['config']['scenario']} model={result['model_state']} "
+          f"boot={result['boot_seconds']:.1f}s")
+    print(f"requests/sec={result['requests_per_sec']:.1f} events/sec={result['events_per_sec']:.1f} "
+          f"peak_rss={result['peak_rss_mb']} MB error_rate={result['errors']['error_rate']:.3f} "
+          f"replies={result['replies']}/{result['config']['events']} "
+          f"failed={result['errors']['failed_replies']} busy={result['busy']}")
+    for stage, s in result["latency"].items():
+        if s.get("count"):
+            print(f"  {stage:<11} n={s['count']:<5} p50={s['p50_ms']:8.1f}ms "
+                  f"p95={s['p95_ms']:8.1f}ms p99={s['p99_ms']:8.1f}ms")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="End-to-end load test for the ChilliBot webhook")
+    ap.add_argument("--scenario", choices=["text", "image", "burst", "mixed"], default="image")
+    ap.add_argument("--requests", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--burst-size", type=int, default=5)
+    ap.add_argument("--images", default="", help="folder of sample chili images (default: synthetic)")
+    ap.add_argument("--model-url", default="", help="model URL for the server (default: offline, local file only)")
+    ap.add_argument("--backend", default="",
+                    help="ML_BACKEND for the server (default: fake stand-in model, keras with --model-url)")
+    ap.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--ready-timeout", type=float, default=300.0)
+    ap.add_argument("--reply-timeout", type=float, default=120.0)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args(argv)
+
+    try:
+        result = run(args)
+    except RuntimeError as e:
+        print(f"[BENCH] {e}", file=sys.stderr)
+        return 1
+    print_summary(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return 0 if result["errors"]["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+สร้าง webhook payload ของ LINE พร้อมลายเซ็น X-Line-Signature (HMAC-SHA256 ด้วย channel secret)
+"""
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import time
+import uuid
+
+_counter = itertools.count(1)
+
+
+def sign(body: bytes, channel_secret: str) -> str:
+    digest = hmac.new(channel_secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def _base_event(user_id: str):
+    n = next(_counter)
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": uuid.uuid4().hex.upper()[:26],
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"bench-reply-{n}-{uuid.uuid4().hex[:8]}",
+    }
+
+
+def text_event(text: str, user_id: str = "Ubench0001"):
+    event = _base_event(user_id)
+    event["message"] = {
+        "id": str(next(_counter)),
+        "type": "text",
+        "quoteToken": "q",
+        "text": text,
+    }
+    return event
+
+
+def image_event(user_id: str = "Ubench0001", image_set=None):
+    event = _base_event(user_id)
+    event["message"] = {
+        "id": str(10_000_000 + next(_counter)),
+        "type": "image",
+        "quoteToken": "q",
+        "contentProvider": {"type": "line"},
+    }
+    if image_set is not None:
+        event["message"]["imageSet"] = image_set
+    return event
+
+
+def burst_events(count: int, user_id: str = "Ubench0001"):
+    """ภาพหลายภาพที่ผู้ใช้ส่งพร้อมกัน (imageSet เดียวกัน)"""
+    set_id = uuid.uuid4().hex.upper()
+    return [
+        image_event(user_id, {"id": set_id, "index": i + 1, "total": count})
+        for i in range(count)
+    ]
+
+
+def webhook_body(events, destination: str = "Ubenchdestination") -> bytes:
+    return json.dumps({"destination": destination, "events": events}, ensure_ascii=False).encode("utf-8")
+
+
+def signed_request(events, channel_secret: str):
+    """คืน (body, headers) พร้อมส่งเข้า POST /webhook"""
+    body = webhook_body(events)
+    headers = {
+        "Content-Type": "application/json",
+        "X-Line-Signature": sign(body, channel_secret),
+    }
+    return body, headers
@@ -0,0 +1,193 @@
+"""
+วิเคราะห์ภาพจำนวนมากแบบ offline (โฟลเดอร์ / zip / ไฟล์อัปโหลด) ผลออกเป็น JSONL ทีละบรรทัด
+
+- อ่านไฟล์ทีละภาพ (ไม่โหลดทั้ง dataset เข้า RAM)
+- decode/preprocess หลาย thread พร้อมกัน, inference รวม batch ผ่าน MicroBatcher ของ ml_model
+- ผลออกตามลำดับ input, --resume ข้ามภาพที่มีในไฟล์ผลลัพธ์แล้ว
+
+ตัวอย่าง:
+    python bulk_diagnosis.py photos/ -o results.jsonl
+    python bulk_diagnosis.py field_2024.zip -o results.jsonl --resume
+"""
+import argparse
+import json
+import os
+import sys
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# ขนาดสูงสุด (bytes) ของภาพ 1 ไฟล์ใน zip / ที่ upload (หลังแตก zip) กัน zip bomb กิน RAM
+BULK_MAX_FILE_BYTES = int(os.getenv("BULK_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+
+
+def _is_image(name: str) -> bool:
+    return name.lower().endswith(IMAGE_EXTS)
+
+
+def iter_directory(folder: str):
+    """คืน (ชื่อ, ฟังก์ชันอ่าน bytes) เรียงตามชื่อ อ่านไฟล์ตอนถูกเรียกเท่านั้น"""
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            if _is_image(name):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, folder)
+
+                def load(path=path):
+                    with open(path, "rb") as f:
+                        return f.read()
+
+                yield rel, load
+
+
+def _too_large(name: str, size: int, max_bytes: int):
+    """loader ของไฟล์ที่ใหญ่เกิน: ไม่อ่านเลย ได้ record error แทน"""
+    def load():
+        raise ValueError(f"{name} is {size} bytes, over the {max_bytes} byte limit")
+    return load
+
+
+def iter_zip(zf: zipfile.ZipFile, max_bytes: int = BULK_MAX_FILE_BYTES):
+    for info in zf.infolist():
+        if info.is_dir() or not _is_image(info.filename):
+            continue
+        # file_size คือขนาดหลังแตก zip ZipFile อ่านไม่เกินค่านี้ จึงตรวจก่อนอ่านได้
+        if max_bytes and info.file_size > max_bytes:
+            yield info.filename, _too_large(info.filename, info.file_size, max_bytes)
+            continue
+        yield info.filename, (lambda info=info: zf.read(info))
+
+
+def iter_uploads(files, max_bytes: int = BULK_MAX_FILE_BYTES):
+    """files: list ของ (ชื่อ, file-like) เช่น werkzeug FileStorage"""
+    for name, fileobj in files:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            # ไม่ปิด ZipFile ตรงนี้: loader ของภาพท้าย ๆ ยังถูกเรียกใน worker หลัง generator นี้จบ
+            zf = zipfile.ZipFile(fileobj)
+            for item_name, load in iter_zip(zf, max_bytes):
+                yield f"{name}/{item_name}", load
+        else:
+            size = fileobj.seek(0, os.SEEK_END)
+            fileobj.seek(0)
+            if max_bytes and size > max_bytes:
+                yield name, _too_large(name, size, max_bytes)
+            else:
+                yield name, fileobj.read
+
+
+def open_source(path: str):
+    """โฟลเดอร์หรือไฟล์ zip -> iterator ของ (ชื่อ, loader)"""
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if zipfile.is_zipfile(path):
+        zf = zipfile.ZipFile(path)
+        return iter_zip(zf)
+    raise ValueError(f"{path} is not a directory or zip file")
+
+
+def read_done(output_path: str) -> set:
+    """ชื่อภาพที่มีผลแล้วในไฟล์ JSONL (ใช้ตอน resume)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                # บรรทัดสุดท้ายอาจขาดเพราะถูกหยุดกลางทาง
+                continue
+    return done
+
+
+def _diagnose(name, load):
+    from ml_model import predict_image
+
+    try:
+        result = predict_image(load())
+    except Exception as e:
+        return {"path": name, "ok": False, "error": str(e)}
+    record = {
+        "path": name,
+        "ok": result.get("ok", False),
+        "class_id": result.get("class_id"),
+        "confidence": round(float(result.get("confidence") or 0.0), 2),
+        "disease_name": result.get("disease_name"),
+    }
+    return record
+
+
+def diagnose_stream(sources, workers: int = 8, prefetch: int = 64, skip=None):
+    """
+    วิเคราะห์ทุกภาพใน sources คืน generator ของ record (dict) ตามลำดับ input
+    มีงานค้างไม่เกิน prefetch ภาพ หน่วยความจำจึงคงที่ไม่ขึ้นกับขนาด dataset
+    """
+    skip = skip or set()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk") as pool:
+        for name, load in sources:
+            if name in skip:
+                continue
+            pending.append(pool.submit(_diagnose, name, load))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def default_workers() -> int:
+    from ml_model import ML_MAX_BATCH_SIZE
+
+    # ให้มีงานพร้อมพอที่จะเต็ม batch ระหว่างที่ thread อื่น decode อยู่
+    return max(2 * ML_MAX_BATCH_SIZE, os.cpu_count() or 1)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Bulk chili disease diagnosis to JSONL")
+    ap.add_argument("input", help="folder or .zip of images")
+    ap.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    ap.add_argument("--resume", action="store_true", help="skip images already in --output")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--prefetch", type=int, default=64)
+    args = ap.parse_args(argv)
+
+    import ml_model
+
+    ml_model.load_ml_model()
+    if not ml_model.MODEL_READY:
+        print(f"[BULK] Model not ready: {ml_model.MODEL_ERROR}", file=sys.stderr)
+        return 2
+
+    to_stdout = args.output == "-"
+    skip = read_done(args.output) if (args.resume and not to_stdout) else set()
+    if skip:
+        print(f"[BULK] Resuming, {len(skip)} images already done", file=sys.stderr)
+
+    out = sys.stdout if to_stdout else open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    count = 0
+    try:
+        records = diagnose_stream(
+            open_source(args.input),
+            workers=args.workers or default_workers(),
+            prefetch=args.prefetch,
+            skip=skip,
+        )
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 100 == 0:
+                out.flush()
+                print(f"[BULK] {count} images", file=sys.stderr)
+    finally:
+        if not to_stdout:
+            out.close()
+
+    print(f"[BULK] Done: {count} images", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+หา threshold ของ cascade (โมเดลคัดกรอง -> โมเดลเต็ม) จากโฟลเดอร์ภาพที่มี label
+
+โครงสร้างโฟลเดอร์: <labelled>/<class_id>/*.jpg  (class_id ตรงกับ DISEASE_INFO)
+
+ตัวอย่าง:
+    python calibrate_cascade.py --labelled data/val --screen screen_128.tflite --size 128
+แสดงตาราง threshold -> ความแม่นยำ / สัดส่วนที่ต้องส่งต่อ / compute เทียบกับโมเดลเต็มอย่างเดียว
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from ml_backends import create_backend
+from ml_model import IMG_SIZE, MODEL_PATH, _decode_image, _to_input, backend_for_path
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def iter_labelled(folder: str, limit: int = 0):
+    count = 0
+    for label in sorted(os.listdir(folder)):
+        sub = os.path.join(folder, label)
+        if not os.path.isdir(sub) or not label.isdigit():
+            continue
+        for name in sorted(os.listdir(sub)):
+            if name.lower().endswith(IMAGE_EXTS):
+                yield os.path.join(sub, name), int(label)
+                count += 1
+                if limit and count >= limit:
+                    return
+
+
+def run_model(backend, images, size, batch_size: int = 16):
+    """คืน (preds, เวลาเฉลี่ยต่อภาพเป็นวินาที)"""
+    outputs = []
+    elapsed = 0.0
+    for i in range(0, len(images), batch_size):
+        batch = np.stack([_to_input(img, size) for img in images[i:i + batch_size]]).astype(np.float32) / 255.0
+        t0 = time.perf_counter()
+        outputs.append(np.asarray(backend.predict(batch)))
+        elapsed += time.perf_counter() - t0
+    return np.concatenate(outputs), elapsed / max(1, len(images))
+
+
+def sweep(screen_preds, full_preds, labels, screen_cost, full_cost, thresholds):
+    screen_conf = screen_preds.max(axis=1) * 100.0
+    screen_top1 = screen_preds.argmax(axis=1)
+    full_top1 = full_preds.argmax(axis=1)
+    full_acc = float(np.mean(full_top1 == labels))
+
+    rows = []
+    for t in thresholds:
+        accept = screen_conf >= t
+        cascade_top1 = np.where(accept, screen_top1, full_top1)
+        escalation = 1.0 - float(np.mean(accept))
+        cost = screen_cost + escalation * full_cost
+        rows.append(
+            {
+                "threshold": t,
+                "accuracy": float(np.mean(cascade_top1 == labels)),
+                "agreement_with_full": float(np.mean(cascade_top1 == full_top1)),
+                "escalation_rate": escalation,
+                "relative_compute": cost / full_cost if full_cost else 0.0,
+            }
+        )
+    return full_acc, rows
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Calibrate the cascade screening threshold")
+    ap.add_argument("--labelled", required=True, help="folder with <class_id>/ subfolders")
+    ap.add_argument("--screen", required=True, help="screening model (.keras/.tflite/.onnx)")
+    ap.add_argument("--size", type=int, default=128, help="screening model input size")
+    ap.add_argument("--full", default=MODEL_PATH, help="full model")
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--max-drop", type=float, default=0.01, help="allowed accuracy drop vs full model")
+    args = ap.parse_args(argv)
+
+    items = list(iter_labelled(args.labelled, args.limit))
+    if not items:
+        print("[CALIBRATE] No labelled images found.")
+        return 1
+    images = [_decode_image(path) for path, _ in items]
+    labels = np.array([label for _, label in items])
+
+    screen = create_backend(backend_for_path(args.screen), args.screen)
+    full = create_backend(backend_for_path(args.full), args.full)
+    screen_preds, screen_cost = run_model(screen, images, (args.size, args.size))
+    full_preds, full_cost = run_model(full, images, IMG_SIZE)
+
+    thresholds = [50, 60, 70, 75, 80, 85, 90, 92, 94, 96, 98, 99]
+    full_acc, rows = sweep(screen_preds, full_preds, labels, screen_cost, full_cost, thresholds)
+
+    print(f"[CALIBRATE] {len(items)} images, full model accuracy {full_acc * 100:.2f}%")
+    print(f"[CALIBRATE] Cost per image: screen {screen_cost * 1000:.2f} ms, full {full_cost * 1000:.2f} ms")
+    print(f"{'threshold':>9} {'accuracy':>9} {'agree':>7} {'escalate':>9} {'compute':>8}")
+    best = None
+    for r in rows:
+        print(
+            f"{r['threshold']:>9.0f} {r['accuracy'] * 100:>8.2f}% {r['agreement_with_full'] * 100:>6.2f}% "
+            f"{r['escalation_rate'] * 100:>8.2f}% {r['relative_compute']:>7.2f}x"
+        )
+        if best is None and r["accuracy"] >= full_acc - args.max_drop:
+            best = r
+
+    if best is None:
+        print("[CALIBRATE] No threshold keeps accuracy within --max-drop; cascade not recommended.")
+        return 1
+    print(f"[CALIBRATE] Suggested ML_SCREEN_THRESHOLD={best['threshold']:.0f} "
+          f"(compute {best['relative_compute']:.2f}x of full model)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
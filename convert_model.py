@@ -0,0 +1,135 @@
+"""
+แปลงโมเดล .keras เป็น .tflite (หรือ .onnx) เพื่อใช้กับ ML_BACKEND=tflite / onnx
+แล้วตรวจว่า top-1 ตรงกับโมเดลเดิมบนภาพตัวอย่าง
+
+ตัวอย่าง:
+    python convert_model.py --quantize dynamic --samples samples/
+    python convert_model.py --quantize int8 --samples samples/ --min-agreement 0.97
+    python convert_model.py --format onnx --quantize dynamic --samples samples/
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from ml_backends import create_backend
+
+IMG_SIZE = (224, 224)
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_samples(folder: str, limit: int = 200):
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTS):
+                paths.append(os.path.join(root, name))
+    paths = sorted(paths)[:limit]
+
+    xs = []
+    for p in paths:
+        img = Image.open(p)
+        img.draft("RGB", IMG_SIZE)
+        img = img.convert("RGB").resize(IMG_SIZE)
+        xs.append(np.asarray(img, dtype=np.float32) / 255.0)
+    if not xs:
+        return paths, np.zeros((0,) + IMG_SIZE + (3,), dtype=np.float32)
+    return paths, np.stack(xs)
+
+
+def convert_tflite(keras_path: str, out_path: str, quantize: str, samples):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        if len(samples) == 0:
+            raise SystemExit("--quantize int8 needs --samples for calibration")
+
+        def representative_dataset():
+            for x in samples:
+                yield [x[None, ...]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def convert_onnx(keras_path: str, out_path: str, quantize: str):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(keras_path)
+    spec = (tf.TensorSpec((None,) + IMG_SIZE + (3,), tf.float32, name="input"),)
+
+    raw_path = out_path if quantize == "none" else out_path + ".fp32"
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=raw_path)
+
+    if quantize != "none":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # onnx: ใช้ dynamic quantization (weight เป็น int8) ทั้ง dynamic และ int8
+        quantize_dynamic(raw_path, out_path, weight_type=QuantType.QInt8)
+        os.remove(raw_path)
+
+
+def top1_agreement(reference, candidate, samples, batch_size: int = 16):
+    if len(samples) == 0:
+        return None
+    agree = 0
+    for i in range(0, len(samples), batch_size):
+        batch = samples[i:i + batch_size]
+        a = np.argmax(reference.predict(batch), axis=1)
+        b = np.argmax(candidate.predict(batch), axis=1)
+        agree += int(np.sum(a == b))
+    return agree / len(samples)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Convert the ChilliBot Keras model to TFLite/ONNX")
+    ap.add_argument("--keras", default="ChiliDisease7_finetune.keras")
+    ap.add_argument("--format", choices=["tflite", "onnx"], default="tflite")
+    ap.add_argument("--out", default="")
+    ap.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="dynamic")
+    ap.add_argument("--samples", default="", help="folder of sample images (calibration + agreement check)")
+    ap.add_argument("--limit", type=int, default=200)
+    ap.add_argument("--min-agreement", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    out = args.out or os.path.splitext(args.keras)[0] + "." + args.format
+    paths, samples = load_samples(args.samples, args.limit) if args.samples else ([], np.zeros((0,)))
+
+    print(f"[CONVERT] {args.keras} -> {out} ({args.format}, quantize={args.quantize})")
+    if args.format == "tflite":
+        convert_tflite(args.keras, out, args.quantize, samples)
+    else:
+        convert_onnx(args.keras, out, args.quantize)
+
+    size_in = os.path.getsize(args.keras) / (1024 * 1024)
+    size_out = os.path.getsize(out) / (1024 * 1024)
+    print(f"[CONVERT] Size: {size_in:.2f} MB -> {size_out:.2f} MB")
+
+    if not paths:
+        print("[CONVERT] No samples given, skipped agreement check.")
+        return 0
+
+    reference = create_backend("keras", args.keras)
+    candidate = create_backend(args.format, out)
+    agreement = top1_agreement(reference, candidate, samples)
+    print(f"[CONVERT] Top-1 agreement on {len(paths)} images: {agreement * 100:.2f}%")
+
+    if agreement < args.min_agreement:
+        print(f"[CONVERT] Agreement below --min-agreement {args.min_agreement:.2f}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+กัน webhook ซ้ำ (LINE redelivery) ก่อนใส่คิว: จำ webhookEventId / message id ไว้ช่วง TTL
+
+backend (DEDUPE_BACKEND):
+- memory            : ใน process (ค่าเริ่มต้น)
+- sqlite:///path.db : ใช้ร่วมกันหลาย worker บนเครื่องเดียวกัน
+- redis://host:6379 : ใช้ร่วมกันหลายเครื่อง (ต้องติดตั้ง redis)
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEDUPE_BACKEND = os.getenv("DEDUPE_BACKEND", "memory")
+DEDUPE_TTL = float(os.getenv("DEDUPE_TTL", "3600"))
+DEDUPE_MAX_ENTRIES = int(os.getenv("DEDUPE_MAX_ENTRIES", "100000"))
+
+
+def event_key(event):
+    """key ของ event: webhookEventId (เหมือนเดิมทุกครั้งที่ redeliver) หรือ message id"""
+    event_id = getattr(event, "webhook_event_id", None)
+    if event_id:
+        return f"evt:{event_id}"
+    message = getattr(event, "message", None)
+    if message is not None and getattr(message, "id", None):
+        return f"msg:{message.id}"
+    return None
+
+
+class InMemoryDedupeStore:
+    """
+    จำ key ตามลำดับเวลา (TTL เท่ากันทุก key) หมดอายุจากหัวคิว และจำกัดจำนวนสูงสุด
+    หน่วยความจำจึงคงที่แม้ traffic ต่อเนื่อง
+    """
+
+    # seen() ไม่ทำ I/O เรียกใน event loop ได้เลย
+    blocking = False
+
+    def __init__(self, ttl: float = DEDUPE_TTL, max_entries: int = DEDUPE_MAX_ENTRIES):
+        self.ttl = float(ttl)
+        self.max_entries = max(1, int(max_entries))
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._keys:
+            key, expires = next(iter(self._keys.items()))
+            if expires > now and len(self._keys) < self.max_entries:
+                break
+            self._keys.popitem(last=False)
+
+    def seen(self, key: str) -> bool:
+        """True ถ้าเคยเห็น key นี้แล้ว (ยังไม่หมดอายุ) ไม่งั้นจดไว้แล้วคืน False"""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._keys.get(key)
+            if expires is not None and expires > now:
+                return True
+            self._keys.pop(key, None)
+            self._expire(now)
+            self._keys[key] = now + self.ttl
+            self._keys.move_to_end(key)
+            return False
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class SQLiteDedupeStore:
+    blocking = True
+
+    def __init__(self, path: str, ttl: float = DEDUPE_TTL, purge_every: int = 1000):
+        self.ttl = float(ttl)
+        self.purge_every = purge_every
+        self._ops = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_seen (key TEXT PRIMARY KEY, expires REAL NOT NULL)"
+        )
+
+    def seen(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._ops += 1
+            if self._ops % self.purge_every == 0:
+                self._db.execute("DELETE FROM webhook_seen WHERE expires <= ?", (now,))
+            # แทนที่เฉพาะ key ที่หมดอายุแล้ว, ถ้ายังไม่หมดอายุ rowcount = 0 (ซ้ำ)
+            cur = self._db.execute(
+                "INSERT INTO webhook_seen (key, expires) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET expires = excluded.expires "
+                "WHERE webhook_seen.expires <= ?",
+                (key, now + self.ttl, now),
+            )
+            return cur.rowcount == 0
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM webhook_seen").fetchone()[0]
+
+
+class RedisDedupeStore:
+    blocking = True
+
+    def __init__(self, url: str, ttl: float = DEDUPE_TTL, prefix: str = "chillibot:seen:"):
+        import redis
+
+        self.ttl = max(1, int(ttl))
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def seen(self, key: str) -> bool:
+        return not self._redis.set(self.prefix + key, b"1", nx=True, ex=self.ttl)
+
+    def __len__(self):
+        return -1
+
+
+def create_dedupe_store(spec: str = DEDUPE_BACKEND):
+    spec = (spec or "memory").strip()
+    if spec == "memory":
+        return InMemoryDedupeStore()
+    if spec.startswith("sqlite:///"):
+        return SQLiteDedupeStore(spec[len("sqlite:///"):])
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisDedupeStore(spec)
+    raise ValueError(f"Unknown DEDUPE_BACKEND '{spec}'")
+
+
+class WebhookDeduper:
+    """กรอง event ซ้ำออกจาก list และนับจำนวนที่ถูกกรอง"""
+
+    def __init__(self, store=None):
+        self.store = store or create_dedupe_store()
+        self.checked = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    @property
+    def blocking(self) -> bool:
+        """True ถ้า filter() ทำ I/O (sqlite/redis) ต้องเรียกนอก event loop"""
+        return getattr(self.store, "blocking", True)
+
+    def filter(self, events):
+        fresh = []
+        for event in events:
+            key = event_key(event)
+            self.checked += 1
+            try:
+                duplicate = key is not None and self.store.seen(key)
+            except Exception as e:
+                # store ใช้ไม่ได้ (เช่น redis หลุด) ให้ทำงานต่อ ดีกว่าทิ้ง event
+                self.errors += 1
+                print("[DEDUPE] Store error:", e)
+                duplicate = False
+            if duplicate:
+                self.duplicates += 1
+                print(f"[DEDUPE] Skip duplicate {key}")
+                continue
+            fresh.append(event)
+        return fresh
+
+    def stats(self) -> dict:
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "entries": len(self.store),
+        }
@@ -0,0 +1,188 @@
+import threading
+import queue
+
+
+class _Lane:
+    """คิว + worker thread ของงานประเภทหนึ่ง"""
+
+    def __init__(self, name: str, workers: int, queue_size: int, match=None):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.match = match
+        self.threads = []
+        self.active = 0
+        self.dropped = 0
+
+
+class EventDispatcher:
+    """
+    กระจาย webhook event ไปยัง handler บน worker thread แยกจาก event loop
+
+    - ลงทะเบียน handler ด้วย @dispatcher.add(MessageEvent, message=TextMessageContent)
+      (รูปแบบเดียวกับ linebot WebhookHandler)
+    - submit(events) แค่ใส่คิวแล้วคืนทันที งานดาวน์โหลด/วิเคราะห์/ตอบกลับทำใน worker
+    - workers / queue_size: ของ lane หลัก (ข้อความ และงานเบาอื่น ๆ)
+    - add_lane(): แยกงานหนัก (เช่นวิเคราะห์ภาพ) ไปคิวของตัวเอง จำนวน worker ของ lane
+      คือจำนวนงานที่ทำพร้อมกันได้ งานเบาจึงไม่ต้องรอหลังงานหนัก
+    - on_reject(event, lane): ถูกเรียกเมื่อคิวของ lane เต็ม (ไม่งั้นทิ้งเฉย ๆ)
+    """
+
+    def __init__(self, workers: int = 4, queue_size: int = 100):
+        self._default_lane = _Lane("default", workers, queue_size)
+        self._lanes = [self._default_lane]
+        self._handlers = {}
+        self._default = None
+        self._lock = threading.Lock()
+        self._started = False
+
+        self.on_reject = None
+
+    @property
+    def workers(self) -> int:
+        return self._default_lane.workers
+
+    @property
+    def dropped(self) -> int:
+        return sum(lane.dropped for lane in self._lanes)
+
+    # ===== ลงทะเบียน handler =====
+    def add(self, event, message=None):
+        def decorator(func):
+            self._handlers[self._key(event, message)] = func
+            return func
+
+        return decorator
+
+    def default(self):
+        def decorator(func):
+            self._default = func
+            return func
+
+        return decorator
+
+    def add_lane(self, name: str, workers: int, queue_size: int, match):
+        """event ที่ match(event) เป็น True จะไปเข้า lane นี้ (ต้องเรียกก่อน start)"""
+        lane = _Lane(name, workers, queue_size, match)
+        self._lanes.insert(len(self._lanes) - 1, lane)
+        return lane
+
+    @staticmethod
+    def _key(event, message=None):
+        if message is None:
+            return event.__name__
+        return event.__name__ + "_" + message.__name__
+
+    def _find_handler(self, event):
+        message = getattr(event, "message", None)
+        func = None
+        if message is not None:
+            func = self._handlers.get(self._key(event.__class__, message.__class__))
+        if func is None:
+            func = self._handlers.get(self._key(event.__class__))
+        if func is None:
+            func = self._default
+        return func
+
+    def dispatch(self, event):
+        """เรียก handler ของ event แบบ sync (ใช้ใน worker หรือในเทสต์)"""
+        func = self._find_handler(event)
+        if func is None:
+            print(f"[WORKER] No handler for {event.__class__.__name__}")
+            return
+        func(event)
+
+    def _lane_for(self, event) -> _Lane:
+        for lane in self._lanes:
+            if lane.match is not None and lane.match(event):
+                return lane
+        return self._default_lane
+
+    # ===== worker pool =====
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for lane in self._lanes:
+                for i in range(lane.workers):
+                    t = threading.Thread(
+                        target=self._run, args=(lane,), name=f"webhook-{lane.name}-{i}", daemon=True
+                    )
+                    t.start()
+                    lane.threads.append(t)
+        print("[WORKER] Started " + ", ".join(f"{l.name}={l.workers}" for l in self._lanes) + " webhook workers")
+
+    def stop(self, timeout: float = 10.0):
+        with self._lock:
+            self._started = False
+            lanes = [(lane, lane.threads) for lane in self._lanes]
+            for lane in self._lanes:
+                lane.threads = []
+        for lane, threads in lanes:
+            for _ in threads:
+                lane.queue.put(None)
+        for _, threads in lanes:
+            for t in threads:
+                t.join(timeout=timeout)
+
+    def submit(self, events) -> int:
+        """ใส่ event เข้าคิวโดยไม่บล็อก คืนจำนวน event ที่รับไว้"""
+        if not self._started:
+            self.start()
+
+        accepted = 0
+        for event in events:
+            lane = self._lane_for(event)
+            try:
+                lane.queue.put_nowait((self.dispatch, event))
+                accepted += 1
+            except queue.Full:
+                lane.dropped += 1
+                print(f"[WORKER] {lane.name} queue full, rejected {event.__class__.__name__}")
+                if self.on_reject is not None:
+                    self.on_reject(event, lane.name)
+        return accepted
+
+    def submit_call(self, func, item, lane: str = "default") -> bool:
+        """
+        ใส่งาน func(item) ลง lane ที่ระบุ (เช่นตอบ "ระบบไม่ว่าง" ใน lane หลัก
+        หรือวิเคราะห์ภาพทั้งกลุ่มใน lane "image") คืน False ถ้าคิวเต็ม
+        """
+        if not self._started:
+            self.start()
+        target = next((l for l in self._lanes if l.name == lane), self._default_lane)
+        try:
+            target.queue.put_nowait((func, item))
+            return True
+        except queue.Full:
+            target.dropped += 1
+            return False
+
+    def queue_depth(self, lane: str = "default") -> int:
+        for l in self._lanes:
+            if l.name == lane:
+                return l.queue.qsize()
+        return 0
+
+    def lane_stats(self) -> dict:
+        return {
+            l.name: {"workers": l.workers, "active": l.active, "queued": l.queue.qsize(), "dropped": l.dropped}
+            for l in self._lanes
+        }
+
+    def _run(self, lane: _Lane):
+        while True:
+            item = lane.queue.get()
+            if item is None:
+                break
+            func, event = item
+            with self._lock:
+                lane.active += 1
+            try:
+                func(event)
+            except Exception as e:
+                print("[ERROR] Webhook handler error:", e)
+            finally:
+                with self._lock:
+                    lane.active -= 1
@@ -0,0 +1,137 @@
+"""
+รวมภาพที่ผู้ใช้ส่งมาติด ๆ กัน (ภาพต้นเดียวกันหลายมุม) เป็นกลุ่มเดียว
+เพื่อวิเคราะห์เป็น batch เดียวและตอบกลับครั้งเดียว
+
+key ของกลุ่ม: imageSet.id ของ LINE (ถ้ามี) ไม่งั้น แชท + ผู้ใช้
+ปล่อยกลุ่มเมื่อ: ครบ imageSet.total / ครบ IMAGE_GROUP_MAX ภาพ /
+ไม่มีภาพใหม่ภายใน IMAGE_GROUP_WINDOW_MS / รอรวมเกิน IMAGE_GROUP_MAX_WAIT_MS
+"""
+import os
+import threading
+import time
+
+# IMAGE_GROUP_WINDOW_MS=0 คือปิดการรวมภาพ (วิเคราะห์/ตอบทีละภาพแบบเดิม)
+IMAGE_GROUP_WINDOW_MS = float(os.getenv("IMAGE_GROUP_WINDOW_MS", "1500"))
+IMAGE_GROUP_MAX_WAIT_MS = float(os.getenv("IMAGE_GROUP_MAX_WAIT_MS", "5000"))
+IMAGE_GROUP_MAX = int(os.getenv("IMAGE_GROUP_MAX", "10"))
+
+
+def group_key(event) -> str:
+    image_set = getattr(event.message, "image_set", None)
+    if image_set is not None and getattr(image_set, "id", None):
+        return "set:" + image_set.id
+    source = event.source
+    chat = getattr(source, "group_id", None) or getattr(source, "room_id", None) or ""
+    user = getattr(source, "user_id", None) or ""
+    if not chat and not user:
+        return "msg:" + event.message.id
+    return f"chat:{chat}:{user}"
+
+
+class _Group:
+    __slots__ = ("events", "expected", "first", "deadline")
+
+    def __init__(self, now):
+        self.events = []
+        self.expected = 0
+        self.first = now
+        self.deadline = now
+
+
+class ImageGrouper:
+    """
+    add(event) ไม่บล็อก (เรียกใน request ได้) กลุ่มที่ครบจะถูกส่งให้ on_group(events)
+    ทั้งจาก add() เอง (ครบจำนวน) หรือจาก thread จับเวลา (หมด window)
+    """
+
+    def __init__(
+        self,
+        on_group,
+        window_ms: float = IMAGE_GROUP_WINDOW_MS,
+        max_wait_ms: float = IMAGE_GROUP_MAX_WAIT_MS,
+        max_images: int = IMAGE_GROUP_MAX,
+    ):
+        self.on_group = on_group
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_wait = max(self.window, max_wait_ms / 1000.0)
+        self.max_images = max(1, int(max_images))
+
+        self._groups = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+        self.groups = 0
+        self.images = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="image-grouper", daemon=True)
+            self._thread.start()
+
+    def add(self, event):
+        now = time.monotonic()
+        ready = None
+        with self._cond:
+            self._ensure_started()
+            key = group_key(event)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(now)
+            group.events.append(event)
+            image_set = getattr(event.message, "image_set", None)
+            if image_set is not None and getattr(image_set, "total", None):
+                group.expected = image_set.total
+            group.deadline = min(now + self.window, group.first + self.max_wait)
+
+            full = len(group.events) >= self.max_images
+            complete = group.expected and len(group.events) >= group.expected
+            if full or complete:
+                ready = self._pop(key)
+            else:
+                self._cond.notify()
+        if ready:
+            self.on_group(ready)
+
+    def _pop(self, key):
+        events = self._groups.pop(key).events
+        self.groups += 1
+        self.images += len(events)
+        return events
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [k for k, g in self._groups.items() if g.deadline <= now]
+                ready = [self._pop(k) for k in due]
+                if not ready:
+                    next_deadline = min((g.deadline for g in self._groups.values()), default=None)
+                    self._cond.wait(None if next_deadline is None else max(0.0, next_deadline - now))
+                    continue
+            for events in ready:
+                try:
+                    self.on_group(events)
+                except Exception as e:
+                    print("[GROUP] on_group error:", e)
+
+    def flush(self):
+        """ปล่อยทุกกลุ่มที่ค้างอยู่ทันที (ตอน shutdown)"""
+        with self._cond:
+            ready = [self._pop(k) for k in list(self._groups)]
+            self._stopped = True
+            self._cond.notify()
+        for events in ready:
+            self.on_group(events)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = sum(len(g.events) for g in self._groups.values())
+        return {
+            "groups": self.groups,
+            "images": self.images,
+            "pending_images": pending,
+            "mean_group_size": (self.images / self.groups) if self.groups else 0.0,
+        }
@@ -0,0 +1,160 @@
+import threading
+import queue
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    รวม request ที่เข้ามาพร้อม ๆ กันให้เป็น batch เดียว แล้วเรียก predict_fn ครั้งเดียว
+
+    - max_batch_size: จำนวนภาพสูงสุดต่อ 1 forward pass
+    - max_wait_ms: เวลารอสูงสุด (มิลลิวินาที) นับจาก request แรกของ batch
+    - input_scale: ถ้ากำหนด จะคูณค่านี้ตอนคัดลอกภาพลง input tensor ที่จองไว้ล่วงหน้า
+      (เช่น 1/255 เพื่อแปลง uint8 -> float32 0..1 โดยไม่สร้าง array ใหม่ทุกภาพ)
+    - submit(x) คืน Future ที่จะได้ผลลัพธ์ของภาพนั้น (1 แถวของ preds)
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        input_scale=None,
+        dtype=np.float32,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.input_scale = input_scale
+        self.dtype = dtype
+
+        # input tensor ที่ใช้ซ้ำทุก batch (ใช้เฉพาะใน thread ของ batcher)
+        self._buffer = None
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        self._batch_sizes = Counter()
+        self._requests = 0
+
+    def _ensure_started(self):
+        """เรียกขณะถือ _lock"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="ml-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, x) -> Future:
+        """ส่งภาพ 1 ภาพ (shape: H x W x 3) เข้าคิว คืน Future ของผลทำนาย"""
+        fut = Future()
+        # ตรวจ _closed และใส่คิวภายใต้ lock เดียวกับ close() จึงไม่มีงานไหนตามหลังสัญญาณปิด
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._ensure_started()
+            self._queue.put((x, fut))
+        return fut
+
+    def predict(self, x, timeout=None):
+        """เรียกแบบ sync: รอผลของภาพเดียว"""
+        return self.submit(x).result(timeout=timeout)
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # ส่งสัญญาณปิดกลับเข้าคิว ให้ loop หลักจัดการหลังจบ batch นี้
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _assemble(self, xs):
+        """คัดลอก (และ normalize) ภาพลง input tensor ที่จองไว้ คืน view ขนาด n"""
+        shape = tuple(xs[0].shape)
+        if self._buffer is None or self._buffer.shape[1:] != shape:
+            self._buffer = np.empty((self.max_batch_size,) + shape, dtype=self.dtype)
+
+        out = self._buffer[: len(xs)]
+        for i, x in enumerate(xs):
+            if self.input_scale is None:
+                out[i] = x
+            else:
+                np.multiply(x, self.input_scale, out=out[i], casting="unsafe")
+        return out
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect(first)
+            futures = [fut for _, fut in batch]
+            try:
+                xs = self._assemble([x for x, _ in batch])
+                preds = self.predict_fn(xs)
+            except Exception as e:
+                for fut in futures:
+                    fut.set_exception(e)
+            else:
+                for fut, row in zip(futures, preds):
+                    fut.set_result(np.array(row, copy=True))
+
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+
+    def stats(self) -> dict:
+        """สรุปการกระจายขนาด batch เพื่อใช้ปรับค่า max_batch_size / max_wait_ms"""
+        with self._lock:
+            # ใส่ทุกขนาดตั้งแต่ 1..max_batch_size (ค่า 0 ด้วย) ให้ bucket ของ histogram ใน /metrics คงที่
+            sizes = set(range(1, self.max_batch_size + 1)) | set(self._batch_sizes)
+            hist = {n: self._batch_sizes.get(n, 0) for n in sorted(sizes)}
+            batches = sum(hist.values())
+            requests = self._requests
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": batches,
+            "requests": requests,
+            "mean_batch_size": (requests / batches) if batches else 0.0,
+            "batch_size_histogram": hist,
+        }
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is None:
+            return
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            # ยังทำ batch ค้างอยู่: งานที่เหลือในคิวมาก่อนสัญญาณปิด thread จะทำต่อจนหมดเอง
+            return
+        # thread จบแล้ว: งานที่ยังค้างในคิวจะไม่มีใครทำ แจ้ง error ให้ผู้รอ ไม่ให้ค้างตลอดไป
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("MicroBatcher is closed"))
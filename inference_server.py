@@ -0,0 +1,407 @@
+"""
+โหมด inference server: process ที่ถือโมเดล (1 ตัวขึ้นไป) ให้ทุก uvicorn worker ใช้ร่วมกัน
+ไม่ต้องโหลดโมเดลซ้ำในทุก web worker
+
+- แต่ละ inference worker ฟังที่ address ของตัวเอง (Unix socket หรือ host:port)
+- web worker ส่งภาพ (uint8 224x224x3) ผ่าน shared memory ของแต่ละ connection ไม่ต้อง pickle
+- supervisor คอยดู worker ถ้าตายจะสตาร์ทใหม่ ฝั่ง web จะต่อใหม่เอง
+
+รัน:
+    python inference_server.py --workers 2
+แล้วตั้ง ML_INFERENCE_MODE=server ให้ uvicorn (ค่า address ต้องตรงกัน)
+
+authkey: ใช้ ML_INFERENCE_AUTHKEY ถ้าตั้งไว้ (ต้องตั้งเมื่อ web กับ inference อยู่คนละเครื่อง)
+ไม่งั้น supervisor สุ่ม key ใหม่ทุกครั้งที่เริ่ม แล้วเขียนลง ML_INFERENCE_AUTHKEY_FILE (อ่านได้เฉพาะเจ้าของ)
+ให้ web worker บนเครื่องเดียวกันอ่าน ไม่มี key ค่าเริ่มต้น เพราะ channel นี้ unpickle ข้อมูลจากอีกฝั่ง
+"""
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import secrets
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+ML_INFERENCE_SOCKET_DIR = os.getenv("ML_INFERENCE_SOCKET_DIR", "/tmp/chillibot-inference")
+ML_INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "1"))
+ML_INFERENCE_ADDRESSES = os.getenv("ML_INFERENCE_ADDRESSES", "")
+ML_INFERENCE_AUTHKEY = os.getenv("ML_INFERENCE_AUTHKEY", "").encode("utf-8")
+ML_INFERENCE_AUTHKEY_FILE = os.getenv(
+    "ML_INFERENCE_AUTHKEY_FILE", os.path.join(ML_INFERENCE_SOCKET_DIR, "authkey")
+)
+ML_INFERENCE_TIMEOUT = float(os.getenv("ML_INFERENCE_TIMEOUT", "30"))
+ML_INFERENCE_POOL_SIZE = int(os.getenv("ML_INFERENCE_POOL_SIZE", "8"))
+
+# ขนาด slot ของ shared memory ต่อ connection (ภาพ uint8 224x224x3)
+SLOT_BYTES = 224 * 224 * 3
+
+
+def default_addresses(workers: int = ML_INFERENCE_WORKERS):
+    if ML_INFERENCE_ADDRESSES.strip():
+        return [parse_address(a) for a in ML_INFERENCE_ADDRESSES.split(",") if a.strip()]
+    if sys.platform == "win32":
+        return [("127.0.0.1", 7600 + i) for i in range(workers)]
+    return [os.path.join(ML_INFERENCE_SOCKET_DIR, f"worker-{i}.sock") for i in range(workers)]
+
+
+def parse_address(value: str):
+    value = value.strip()
+    if ":" in value and not value.startswith("/"):
+        host, port = value.rsplit(":", 1)
+        return (host, int(port))
+    return value
+
+
+def create_authkey() -> bytes:
+    """(supervisor) ML_INFERENCE_AUTHKEY ถ้าตั้งไว้ ไม่งั้นสุ่มใหม่แล้วเขียนลงไฟล์ mode 0600"""
+    if ML_INFERENCE_AUTHKEY:
+        return ML_INFERENCE_AUTHKEY
+    key = secrets.token_hex(32).encode("ascii")
+    folder = os.path.dirname(os.path.abspath(ML_INFERENCE_AUTHKEY_FILE))
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    tmp = ML_INFERENCE_AUTHKEY_FILE + ".tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp, ML_INFERENCE_AUTHKEY_FILE)
+    return key
+
+
+def load_authkey() -> bytes:
+    """(web worker) ML_INFERENCE_AUTHKEY ถ้าตั้งไว้ ไม่งั้นอ่านไฟล์ที่ supervisor สร้าง"""
+    if ML_INFERENCE_AUTHKEY:
+        return ML_INFERENCE_AUTHKEY
+    try:
+        with open(ML_INFERENCE_AUTHKEY_FILE, "rb") as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        key = b""
+    if not key:
+        raise ConnectionError(
+            f"no inference authkey: set ML_INFERENCE_AUTHKEY or start inference_server.py "
+            f"(writes {ML_INFERENCE_AUTHKEY_FILE})"
+        )
+    return key
+
+
+# ===== ฝั่ง inference worker =====
+def _attach(name: str) -> SharedMemory:
+    shm = SharedMemory(name=name)
+    # shared memory เป็นของฝั่ง client ไม่ให้ resource tracker ของ worker ไปลบทิ้ง
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _serve_connection(conn, engine, info):
+    shm = None
+    try:
+        while True:
+            msg = conn.recv()
+            op = msg[0]
+            if op == "hello":
+                shm = _attach(msg[1])
+                conn.send(("ok", info))
+            elif op == "predict":
+                _, shape, dtype = msg
+                x = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+                try:
+                    conn.send(("ok", engine.predict(x)))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+            elif op == "stats":
+                conn.send(("ok", engine.stats()))
+            else:
+                conn.send(("error", f"unknown op {op}"))
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+        if shm is not None:
+            shm.close()
+
+
+def serve_worker(index: int, address, authkey: bytes, num_threads: int):
+    """entry point ของ inference worker process (1 โมเดลต่อ process)"""
+    # ต้องตั้งก่อน import ml_model เพราะอ่าน env ตอน import
+    os.environ["ML_NUM_THREADS"] = str(num_threads)
+    os.environ["ML_INFERENCE_MODE"] = "local"
+    import ml_model
+
+    ml_model.load_ml_model()
+    if not ml_model.MODEL_READY:
+        print(f"[INFER {index}] Model not ready ({ml_model.MODEL_ERROR}). Exiting.")
+        sys.exit(2)
+
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, authkey=authkey)
+    info = {"worker": index, "pid": os.getpid(), "version": ml_model.MODEL_VERSION}
+    print(f"[INFER {index}] Serving on {address} (threads={num_threads})")
+
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError) as e:
+            # authkey ผิด / client หลุดระหว่าง handshake
+            print(f"[INFER {index}] Rejected connection: {e}")
+            continue
+        threading.Thread(
+            target=_serve_connection, args=(conn, ml_model.engine, info), daemon=True
+        ).start()
+
+
+def supervise(addresses, authkey: bytes, threads_per_worker: int, max_backoff: float = 30.0):
+    """สตาร์ท inference worker ทุกตัว และสตาร์ทใหม่เมื่อ process ตาย"""
+    ctx = mp.get_context("spawn")
+    for a in addresses:
+        if isinstance(a, str):
+            os.makedirs(os.path.dirname(a), exist_ok=True)
+
+    procs = {}
+    restarts = {i: 0 for i in range(len(addresses))}
+    next_start = {i: 0.0 for i in range(len(addresses))}
+    stopping = False
+
+    def start(i):
+        p = ctx.Process(
+            target=serve_worker,
+            args=(i, addresses[i], authkey, threads_per_worker),
+            name=f"chillibot-infer-{i}",
+            daemon=False,
+        )
+        p.start()
+        procs[i] = p
+        print(f"[SUPERVISOR] Started inference worker {i} pid={p.pid}")
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for i in range(len(addresses)):
+        start(i)
+
+    while not stopping:
+        time.sleep(0.5)
+        for i, p in list(procs.items()):
+            if p.is_alive() or stopping:
+                continue
+            now = time.monotonic()
+            if next_start[i] == 0.0:
+                restarts[i] += 1
+                backoff = min(max_backoff, 2 ** min(restarts[i], 5) / 2)
+                next_start[i] = now + backoff
+                print(f"[SUPERVISOR] Worker {i} exited (code={p.exitcode}), restarting in {backoff:.1f}s")
+            elif now >= next_start[i]:
+                next_start[i] = 0.0
+                start(i)
+
+    for p in procs.values():
+        p.terminate()
+    for p in procs.values():
+        p.join(timeout=10)
+
+
+# ===== ฝั่ง web worker =====
+class _Channel:
+    """connection 1 เส้น + shared memory slot ของมัน (ใช้ทีละ request)"""
+
+    def __init__(self, address, authkey: bytes, timeout: float):
+        self.address = address
+        self.timeout = timeout
+        self.conn = Client(address, authkey=authkey)
+        self.shm = SharedMemory(create=True, size=SLOT_BYTES)
+        try:
+            self.conn.send(("hello", self.shm.name))
+            self.info = self._recv()
+        except Exception:
+            self.close()
+            raise
+
+    def _recv(self):
+        if not self.conn.poll(self.timeout):
+            raise TimeoutError(f"inference worker {self.address} timed out")
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def predict(self, x):
+        x = np.ascontiguousarray(x)
+        if x.nbytes > SLOT_BYTES:
+            raise ValueError(f"input too large for shared slot: {x.nbytes} bytes")
+        np.ndarray(x.shape, dtype=x.dtype, buffer=self.shm.buf)[...] = x
+        self.conn.send(("predict", x.shape, x.dtype.str))
+        return self._recv()
+
+    def stats(self):
+        self.conn.send(("stats",))
+        return self._recv()
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except Exception:
+            pass
+
+
+class RemoteEngine:
+    """
+    ใช้แทน MicroBatcher ใน web worker: predict(x) ส่งไปให้ inference worker
+    กระจายแบบ round-robin ถ้า worker ตาย (ระหว่างถูกสตาร์ทใหม่) จะลองต่อใหม่
+    submit(x) คืน Future เหมือน MicroBatcher (รัน predict บน thread pool ขนาด pool_size)
+    """
+
+    def __init__(
+        self,
+        addresses,
+        authkey: bytes = None,
+        pool_size: int = ML_INFERENCE_POOL_SIZE,
+        timeout: float = ML_INFERENCE_TIMEOUT,
+    ):
+        if not addresses:
+            raise ValueError("RemoteEngine needs at least one address")
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.timeout = timeout
+        self._rr = itertools.cycle(range(len(self.addresses)))
+        self._idle = queue.LifoQueue()
+        self.pool_size = max(1, int(pool_size))
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._closed = False
+
+        self.requests = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.info = {}
+
+    def _open(self):
+        # ไม่ได้ระบุ key: อ่านไฟล์ใหม่ทุกครั้งที่ต่อ (supervisor ที่ถูกสตาร์ทใหม่จะสุ่ม key ใหม่)
+        authkey = self.authkey or load_authkey()
+        last = None
+        for _ in range(len(self.addresses)):
+            with self._lock:
+                address = self.addresses[next(self._rr)]
+            try:
+                ch = _Channel(address, authkey, self.timeout)
+                self.info = ch.info
+                return ch
+            except (OSError, EOFError, TimeoutError, AuthenticationError) as e:
+                last = e
+        raise ConnectionError(f"no inference worker available: {last}")
+
+    def connect(self):
+        """ตรวจว่าต่อ worker ได้ (ใช้ตอน startup) คืน info ของ worker"""
+        ch = self._open()
+        self._idle.put(ch)
+        return ch.info
+
+    def predict(self, x, timeout=None):
+        with self._slots:
+            try:
+                ch = self._idle.get_nowait()
+            except queue.Empty:
+                ch = self._open()
+
+            try:
+                result = ch.predict(x)
+            except (OSError, EOFError, TimeoutError):
+                # worker ตาย/ค้าง: ทิ้ง channel นี้แล้วลองอีกครั้งกับ connection ใหม่
+                ch.close()
+                with self._lock:
+                    self.reconnects += 1
+                ch = self._open()
+                try:
+                    result = ch.predict(x)
+                except Exception:
+                    ch.close()
+                    with self._lock:
+                        self.errors += 1
+                    raise
+            except Exception:
+                self._idle.put(ch)
+                with self._lock:
+                    self.errors += 1
+                raise
+
+            self._idle.put(ch)
+            with self._lock:
+                self.requests += 1
+            return result
+
+    def submit(self, x):
+        """ส่งภาพ 1 ภาพแบบไม่รอ คืน Future ของผลทำนาย (ภาพชุดเดียวกันส่งพร้อมกันได้)"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("RemoteEngine is closed")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.pool_size, thread_name_prefix="inference-client"
+                )
+            executor = self._executor
+        return executor.submit(self.predict, x)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": "server",
+                "workers": len(self.addresses),
+                "requests": self.requests,
+                "errors": self.errors,
+                "reconnects": self.reconnects,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ChilliBot shared inference server")
+    ap.add_argument("--workers", type=int, default=ML_INFERENCE_WORKERS)
+    ap.add_argument("--threads", type=int, default=0, help="intra-op threads per worker (default: cores / workers)")
+    args = ap.parse_args(argv)
+
+    workers = max(1, args.workers)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    addresses = default_addresses(workers)
+    authkey = create_authkey()
+    if not ML_INFERENCE_AUTHKEY:
+        print(f"[SUPERVISOR] Generated authkey in {ML_INFERENCE_AUTHKEY_FILE}")
+    print(f"[SUPERVISOR] {workers} inference workers x {threads} threads: {addresses}")
+    supervise(addresses, authkey, threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import os
+import threading
+
+from linebot.v3.messaging import (
+    Configuration,
+    ApiClient,
+    AsyncApiClient,
+    MessagingApi,
+    MessagingApiBlob,
+    AsyncMessagingApi,
+    AsyncMessagingApiBlob,
+)
+
+# host จริงของ LINE (SDK ฝัง host ของ Blob API ไว้ในแต่ละ method)
+DEFAULT_API_HOST = "https://api.line.me"
+DEFAULT_DATA_API_HOST = "https://api-data.line.me"
+
+# ตั้งค่าผ่าน env ได้ เช่นชี้ไปที่ mock LINE API ตอนทดสอบ
+LINE_API_HOST = os.getenv("LINE_API_HOST", DEFAULT_API_HOST)
+LINE_DATA_API_HOST = os.getenv("LINE_DATA_API_HOST", DEFAULT_DATA_API_HOST)
+LINE_POOL_SIZE = int(os.getenv("LINE_POOL_SIZE", "16"))
+LINE_CONNECT_TIMEOUT = float(os.getenv("LINE_CONNECT_TIMEOUT", "5"))
+LINE_READ_TIMEOUT = float(os.getenv("LINE_READ_TIMEOUT", "20"))
+
+
+class _RoutedApiClient(ApiClient):
+    """ApiClient ที่แทน host ตาม map และใส่ timeout ค่าเริ่มต้นให้ทุก request"""
+
+    def __init__(self, configuration, hosts, timeout):
+        super().__init__(configuration)
+        self._hosts = hosts
+        self._timeout = timeout
+
+    def call_api(self, *args, _host=None, _request_timeout=None, **kwargs):
+        return super().call_api(
+            *args,
+            _host=self._hosts.get(_host, _host),
+            _request_timeout=_request_timeout or self._timeout,
+            **kwargs,
+        )
+
+
+class _RoutedAsyncApiClient(AsyncApiClient):
+    def __init__(self, configuration, hosts, timeout):
+        super().__init__(configuration)
+        self._hosts = hosts
+        self._timeout = timeout
+
+    def call_api(self, *args, _host=None, _request_timeout=None, **kwargs):
+        return super().call_api(
+            *args,
+            _host=self._hosts.get(_host, _host),
+            _request_timeout=_request_timeout or self._timeout,
+            **kwargs,
+        )
+
+
+class LineClients:
+    """
+    client ของ LINE Messaging API ที่สร้างครั้งเดียวแล้วใช้ร่วมกันทั้ง process
+    (connection pool เดียว, keep-alive ไม่ต้อง TLS handshake ใหม่ทุก event)
+
+    - messaging / blob: ใช้จาก worker thread (urllib3 pool เป็น thread-safe)
+    - async_messaging / async_blob: ใช้ใน event loop (aiohttp) ต้องสร้างใน loop ที่รันอยู่
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        api_host: str = LINE_API_HOST,
+        data_api_host: str = LINE_DATA_API_HOST,
+        pool_size: int = LINE_POOL_SIZE,
+        connect_timeout: float = LINE_CONNECT_TIMEOUT,
+        read_timeout: float = LINE_READ_TIMEOUT,
+    ):
+        self.configuration = Configuration(host=api_host.rstrip("/"), access_token=access_token)
+        self.configuration.connection_pool_maxsize = max(1, int(pool_size))
+        self._hosts = {
+            DEFAULT_API_HOST: api_host.rstrip("/"),
+            DEFAULT_DATA_API_HOST: data_api_host.rstrip("/"),
+        }
+        self._timeout = (connect_timeout, read_timeout)
+
+        self._lock = threading.Lock()
+        self._api_client = None
+        self._messaging = None
+        self._blob = None
+
+        self._async_client = None
+        self._async_messaging = None
+        self._async_blob = None
+
+    def _client(self):
+        if self._api_client is None:
+            with self._lock:
+                if self._api_client is None:
+                    self._api_client = _RoutedApiClient(self.configuration, self._hosts, self._timeout)
+                    self._messaging = MessagingApi(self._api_client)
+                    self._blob = MessagingApiBlob(self._api_client)
+        return self._api_client
+
+    @property
+    def messaging(self) -> MessagingApi:
+        self._client()
+        return self._messaging
+
+    @property
+    def blob(self) -> MessagingApiBlob:
+        self._client()
+        return self._blob
+
+    def _async(self):
+        if self._async_client is None:
+            # aiohttp ใช้ timeout รวมเป็นตัวเลขเดียว
+            self._async_client = _RoutedAsyncApiClient(
+                self.configuration, self._hosts, sum(self._timeout)
+            )
+            self._async_messaging = AsyncMessagingApi(self._async_client)
+            self._async_blob = AsyncMessagingApiBlob(self._async_client)
+        return self._async_client
+
+    @property
+    def async_messaging(self) -> AsyncMessagingApi:
+        self._async()
+        return self._async_messaging
+
+    @property
+    def async_blob(self) -> AsyncMessagingApiBlob:
+        self._async()
+        return self._async_blob
+
+    def close(self):
+        with self._lock:
+            if self._api_client is not None:
+                self._api_client.close()
+            self._api_client = self._messaging = self._blob = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+        self._async_client = self._async_messaging = self._async_blob = None
@@ -1,24 +1,49 @@
+import hmac
 import os
-import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, JSONResponse
 
-from linebot.v3 import WebhookHandler
+from linebot.v3 import WebhookParser
 from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.webhooks import MessageEvent, TextMessageContent, ImageMessageContent
 
 from linebot.v3.messaging import (
-    Configuration,
-    ApiClient,
-    MessagingApi,
-    MessagingApiBlob,
     ReplyMessageRequest,
     TextMessage,
     ImageMessage,  # เผื่อใช้ส่งรูปประกอบ
 )
 
-from ml_model import predict_image
+from ml_model import (
+    DISEASE_INFO,
+    aggregate_predictions,
+    predict_images,
+    get_batch_stats,
+    get_cache_stats,
+    get_cascade_stats,
+    get_model_state,
+    get_shadow_stats,
+    is_model_loading,
+    start_model_loading,
+    reload_model,
+    end_shadow,
+)
+from event_worker import EventDispatcher
+from line_clients import LineClients
+from dedupe import WebhookDeduper
+from text_intent import INTENT_UNKNOWN, IntentEngine
+from image_groups import IMAGE_GROUP_WINDOW_MS, ImageGrouper
+from admission import (
+    ADMISSION_MAX_QUEUE,
+    ADMIT,
+    EXPIRED,
+    IMAGE_WORKERS,
+    AdmissionController,
+)
+import metrics
 
 
 app = FastAPI()
@@ -29,8 +54,124 @@ CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET", "")
 if not CHANNEL_ACCESS_TOKEN or not CHANNEL_SECRET:
     print("[WARN] LINE_CHANNEL_ACCESS_TOKEN or LINE_CHANNEL_SECRET is empty!")
 
-handler = WebhookHandler(CHANNEL_SECRET)
-configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
+# จำนวน worker ที่ดาวน์โหลดรูป/วิเคราะห์/ตอบกลับพร้อมกัน และขนาดคิวของ event ที่รอ
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "100"))
+
+# token ของ /admin/* (ส่งใน header X-Admin-Token) ว่าง = ปิด endpoint admin
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# parser: ตรวจลายเซ็น + แปลง body เป็น event (เร็ว ทำใน request)
+# handler: กระจาย event ไปยังฟังก์ชันด้านล่างบน worker thread
+parser = WebhookParser(CHANNEL_SECRET)
+handler = EventDispatcher(workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE)
+
+
+def _is_image(event) -> bool:
+    return isinstance(event, MessageEvent) and isinstance(event.message, ImageMessageContent)
+
+
+# ภาพแยกไป lane ของตัวเอง ข้อความจึงไม่ต้องรอหลังภาพ
+# (จำนวนงานที่เข้าโมเดลพร้อมกันจำกัดด้วย admission.inference() ไม่ใช่จำนวน worker)
+handler.add_lane(
+    "image",
+    workers=IMAGE_WORKERS,
+    queue_size=ADMISSION_MAX_QUEUE,
+    match=_is_image,
+)
+admission = AdmissionController()
+# กัน LINE redelivery: event ที่เคยรับแล้วจะไม่ถูกใส่คิวซ้ำ
+deduper = WebhookDeduper()
+metrics.registry.add_collector(
+    "chillibot_batching", get_batch_stats, counters=("batches", "requests", "errors", "reconnects")
+)
+metrics.registry.add_collector(
+    "chillibot_cache", get_cache_stats, counters=("hits", "disk_hits", "misses", "evictions")
+)
+metrics.registry.add_collector("chillibot_cascade", get_cascade_stats, counters=("screened", "escalated"))
+metrics.registry.add_collector("chillibot_webhook", lambda: {
+    "queue_depth": handler.queue_depth(),
+    "image_queue_depth": handler.queue_depth("image"),
+    "image_inflight": handler.lane_stats()["image"]["active"],
+    "dropped": handler.dropped,
+}, counters=("dropped",))
+metrics.registry.add_collector("chillibot_dedupe", deduper.stats, counters=("checked", "duplicates", "errors"))
+metrics.registry.add_collector("chillibot_admission", admission.stats, counters=(
+    "admitted", "completed", "shed_queue_full", "shed_deadline", "deadline_missed", "late_replies",
+))
+metrics.registry.add_collector("chillibot_shadow", get_shadow_stats, counters=("samples", "errors"))
+
+# จำนวนการดาวน์โหลดภาพพร้อมกันของทั้ง process (ภาพชุดเดียวกันดาวน์โหลดพร้อมกัน)
+IMAGE_DOWNLOAD_WORKERS = int(os.getenv("IMAGE_DOWNLOAD_WORKERS", "8"))
+_download_pool = ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS, thread_name_prefix="line-blob")
+
+# ตอบคำถามข้อความจาก DISEASE_INFO (index สร้างครั้งเดียวตอนเริ่ม, ไม่เรียก API ภายนอก)
+intents = IntentEngine(DISEASE_INFO)
+
+# client ของ LINE API ใช้ร่วมกันทั้ง process (keep-alive, ไม่สร้าง ApiClient ใหม่ทุก event)
+line = LineClients(CHANNEL_ACCESS_TOKEN)
+
+
+@app.on_event("startup")
+def start_workers():
+    # โหลดโมเดลเบื้องหลัง ให้ uvicorn bind port ได้ทันที
+    start_model_loading()
+    handler.start()
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    if grouper is not None:
+        grouper.flush()
+    handler.stop()
+    _download_pool.shutdown(wait=False)
+    line.close()
+    await line.aclose()
+
+
+def _reply(reply_token: str, messages):
+    with metrics.stage("reply"):
+        line.messaging.reply_message(
+            ReplyMessageRequest(reply_token=reply_token, messages=messages)
+        )
+
+
+BUSY_TEXT = "ขณะนี้มีผู้ส่งรูปเข้ามาจำนวนมาก กรุณาส่งรูปอีกครั้งในอีกสักครู่ค่ะ"
+
+
+def _reply_busy(event):
+    """ตอบ "ระบบไม่ว่าง" ทันที (ทำใน lane หลัก ไม่ใช้เวลาโมเดล)"""
+    metrics.start_trace("image", message_id=getattr(event.message, "id", None))
+    try:
+        _reply(event.reply_token, [TextMessage(text=BUSY_TEXT)])
+    except Exception as e:
+        print("[ERROR] Busy reply:", e)
+    finally:
+        metrics.end_trace("shed")
+
+
+def _on_reject(event, lane):
+    # คิวภาพเต็ม: ส่งงานตอบ "ไม่ว่าง" ไป lane หลักแทน
+    if lane == "image":
+        admission.reject()
+        handler.submit_call(_reply_busy, event)
+
+
+handler.on_reject = _on_reject
+
+
+def _on_image_group(events):
+    # กลุ่มภาพครบแล้ว: วิเคราะห์ทั้งกลุ่มใน lane "image" (นับเป็นงานเดียวของ admission)
+    if not handler.submit_call(handle_image_group, events, lane="image"):
+        print(f"[WORKER] image queue full, rejected group of {len(events)}")
+        admission.reject()
+        handler.submit_call(_reply_busy, events[-1])
+
+
+# ภาพหลายภาพจากผู้ใช้คนเดียวกันที่มาติด ๆ กัน รวมเป็นกลุ่มเดียว (IMAGE_GROUP_WINDOW_MS=0 = ปิด)
+grouper = ImageGrouper(_on_image_group) if IMAGE_GROUP_WINDOW_MS > 0 else None
+if grouper is not None:
+    metrics.registry.add_collector("chillibot_image_groups", grouper.stats, counters=("groups", "images"))
 
 
 @app.get("/")
@@ -38,6 +179,65 @@ def root():
     return {"status": "ok", "message": "ChilliBot AI is running on Render"}
 
 
+@app.get("/ready")
+def ready():
+    state = get_model_state()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "batching": get_batch_stats(),
+        "cache": get_cache_stats(),
+        "cascade": get_cascade_stats(),
+        "dedupe": deduper.stats(),
+        "admission": admission.stats(),
+        "lanes": handler.lane_stats(),
+        "image_groups": grouper.stats() if grouper is not None else {},
+    }
+
+
+def _check_admin(request: Request):
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/model")
+def admin_model(request: Request):
+    _check_admin(request)
+    return {**get_model_state(), "shadow": get_shadow_stats()}
+
+
+@app.post("/admin/model/reload")
+def admin_reload(request: Request, version: str = "", shadow: bool = False):
+    """โหลดโมเดลใหม่เบื้องหลัง ระหว่างนี้ยังตอบด้วยโมเดลเดิม (shadow=true = เทียบก่อนยังไม่สลับ)"""
+    _check_admin(request)
+    try:
+        started = reload_model(version or None, shadow=shadow)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse({"started": started, **get_model_state()}, status_code=202 if started else 409)
+
+
+@app.post("/admin/model/shadow/{action}")
+def admin_shadow(request: Request, action: str):
+    """action = promote (สลับไปใช้ candidate) | discard (ทิ้ง candidate)"""
+    _check_admin(request)
+    if action not in ("promote", "discard"):
+        raise HTTPException(status_code=404, detail="Unknown action")
+    stats = get_shadow_stats()
+    if not end_shadow(promote=action == "promote"):
+        raise HTTPException(status_code=409, detail="No shadow model")
+    return {"action": action, "shadow": stats, **get_model_state()}
+
+
 # (ช่วยให้ทดสอบเองได้) เปิดได้ในเบราว์เซอร์
 @app.get("/webhook")
 def webhook_get():
@@ -51,91 +251,137 @@ async def callback(request: Request):
 
     # ถ้าลายเซ็นไม่ถูกต้อง ควร 400
     try:
-        handler.handle(body.decode("utf-8"), signature)
+        events = parser.parse(body.decode("utf-8"), signature)
     except InvalidSignatureError:
         raise HTTPException(status_code=400, detail="Invalid signature")
     except Exception as e:
         # อย่าปล่อย 400 เพราะ LINE จะมองว่า webhook ล้มเหลว (Verify อาจไม่ผ่าน)
-        print("[ERROR] Webhook handler error:", e)
+        print("[ERROR] Webhook parse error:", e)
         return PlainTextResponse("OK", status_code=200)
 
+    # ตอบ 200 ทันที งานจริงทำใน worker
+    # store แบบ sqlite/redis เป็น I/O แบบ blocking: ทำใน threadpool ไม่ให้ event loop ค้าง
+    if deduper.blocking:
+        events = await run_in_threadpool(deduper.filter, events)
+    else:
+        events = deduper.filter(events)
+    if grouper is not None:
+        for e in events:
+            if _is_image(e):
+                grouper.add(e)
+        events = [e for e in events if not _is_image(e)]
+    handler.submit(events)
     return PlainTextResponse("OK", status_code=200)
 
 
 @handler.add(MessageEvent, message=TextMessageContent)
 def handle_text_message(event: MessageEvent):
-    user_text = event.message.text
-    reply_text = f"คุณพิมพ์ว่า: {user_text}"
-
-    with ApiClient(configuration) as api_client:
-        line_api = MessagingApi(api_client)
-        line_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=reply_text)],
-            )
+    metrics.start_trace("text")
+    with metrics.stage("intent"):
+        match = intents.match(event.message.text)
+        reply_text = intents.respond_to(match)
+    metrics.annotate(intent=match.intent, class_id=match.class_id)
+
+    _reply(event.reply_token, [TextMessage(text=reply_text)])
+    metrics.end_trace("unmatched" if match.intent == INTENT_UNKNOWN else "ok")
+
+
+def _download_image(message_id: str) -> bytes:
+    content = line.blob.get_message_content(message_id)
+    # ✅ FIX
+    return content if isinstance(content, (bytes, bytearray)) else content.data
+
+
+def _image_messages(results):
+    """ข้อความตอบกลับจากผลวิเคราะห์ 1 ภาพ หรือผลรวมของภาพชุดเดียวกัน คืน (messages, outcome)"""
+    if len(results) == 1:
+        result = results[0]
+        if not result.get("ok"):
+            return [TextMessage(text=result.get("disease_name", "วิเคราะห์ไม่สำเร็จ"))], "failed"
+        msg1 = f"🔍 ผลวิเคราะห์: {result.get('disease_name')}\nความมั่นใจ: {result.get('confidence',0):.2f}%"
+    else:
+        result = aggregate_predictions(results)
+        if not result.get("ok"):
+            return [TextMessage(text=result.get("disease_name", "วิเคราะห์ไม่สำเร็จ"))], "failed"
+        msg1 = (
+            f"🔍 ผลวิเคราะห์จาก {result['images']} ภาพ: {result.get('disease_name')}\n"
+            f"ความมั่นใจรวม: {result.get('confidence',0):.2f}% "
+            f"({result['agreeing']}/{result['analysed']} ภาพตรงกัน)"
         )
+        others = [
+            f"• {DISEASE_INFO[c]['name'] if c in DISEASE_INFO else c} ({n} ภาพ)"
+            for c, n in sorted(result["votes"].items(), key=lambda kv: -kv[1])
+            if c != result["class_id"]
+        ]
+        if others:
+            msg1 += "\nภาพอื่นพบ:\n" + "\n".join(others)
+        if result["analysed"] < result["images"]:
+            msg1 += f"\n({result['images'] - result['analysed']} ภาพวิเคราะห์ไม่ได้)"
+    msg2 = f"✅ คำแนะนำ:\n{result.get('advice','')}\n\nอ่านเพิ่มเติม: {result.get('info_url','')}"
+    return [TextMessage(text=msg1), TextMessage(text=msg2)], "ok"
 
 
 @handler.add(MessageEvent, message=ImageMessageContent)
 def handle_image_message(event: MessageEvent):
-    message_id = event.message.id
-    print(f"[IMG] Received image message id={message_id}")
+    handle_image_group([event])
 
-    tmp_path = None
-    try:
-        with ApiClient(configuration) as api_client:
-            blob_api = MessagingApiBlob(api_client)
-            content = blob_api.get_message_content(message_id)
 
-            # ✅ FIX
-            image_bytes = content if isinstance(content, (bytes, bytearray)) else content.data
+def handle_image_group(events):
+    """
+    ภาพ 1 ภาพ หรือภาพชุดเดียวกันจากผู้ใช้คนเดียว: ดาวน์โหลดพร้อมกัน วิเคราะห์เป็น batch เดียว
+    แล้วตอบครั้งเดียวด้วย reply token ของภาพล่าสุด
+    """
+    event = events[-1]
+    message_ids = [e.message.id for e in events]
+    print(f"[IMG] Received {len(events)} image(s) ids={','.join(message_ids)}")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            tmp.write(image_bytes)
-            tmp_path = tmp.name
+    # โมเดลยังโหลดไม่เสร็จ: ตอบกลับทันที ไม่ต้องดาวน์โหลดรูป (ไม่นับเป็นงานที่ admission รับ)
+    if is_model_loading():
+        metrics.start_trace("image", message_id=message_ids[0], images=len(events))
+        try:
+            _reply(
+                event.reply_token,
+                [TextMessage(text="ระบบกำลังเตรียมโมเดลวิเคราะห์ภาพ กรุณาส่งรูปอีกครั้งในอีกสักครู่ค่ะ")],
+            )
+        finally:
+            metrics.end_trace("not_ready")
+        return
 
-        result = predict_image(tmp_path)
+    # reply token หมดอายุแล้ว ข้ามไป / คาดว่าทำไม่ทันก่อนหมดอายุ ตอบ "ไม่ว่าง" แทน
+    verdict = admission.check(event)
+    if verdict != ADMIT:
+        if verdict == EXPIRED:
+            print(f"[IMG] Reply token expired, skip ids={','.join(message_ids)}")
+            metrics.EVENTS_TOTAL.inc(type="image", outcome="expired")
+        else:
+            _reply_busy(event)
+        return
 
-        # รองรับ predict_image ทั้งแบบ dict และ tuple
-        if isinstance(result, dict):
-            if result.get("ok"):
-                msg1 = f"🔍 ผลวิเคราะห์: {result.get('disease_name')}\nความมั่นใจ: {result.get('confidence',0):.2f}%"
-                msg2 = f"✅ คำแนะนำ:\n{result.get('advice','')}\n\nอ่านเพิ่มเติม: {result.get('info_url','')}"
-                messages = [TextMessage(text=msg1), TextMessage(text=msg2)]
+    metrics.start_trace("image", message_id=message_ids[0], images=len(events))
+    started = time.perf_counter()
+
+    outcome = "ok"
+    try:
+        with metrics.stage("download"):
+            if len(message_ids) == 1:
+                images = [_download_image(message_ids[0])]
             else:
-                messages = [TextMessage(text=result.get("disease_name","วิเคราะห์ไม่สำเร็จ"))]
-        else:
-            label, conf = result
-            messages = [TextMessage(text=f"ผลวิเคราะห์: {label} (ความมั่นใจ {conf:.2f}%)")]
-
-        with ApiClient(configuration) as api_client:
-            msg_api = MessagingApi(api_client)
-            msg_api.reply_message(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=messages,
-                )
-            )
+                images = list(_download_pool.map(_download_image, message_ids))
+
+        # ส่ง bytes เข้าโมเดลตรง ๆ ไม่ต้องเขียนไฟล์ชั่วคราว
+        with metrics.stage("predict"), admission.inference():
+            results = predict_images(images)
+
+        messages, outcome = _image_messages(results)
+        _reply(event.reply_token, messages)
 
     except Exception as e:
         print("[ERROR] Image handler:", e)
-        with ApiClient(configuration) as api_client:
-            msg_api = MessagingApi(api_client)
-            msg_api.reply_message(
-                ReplyMessageRequest(
-                    reply_token=event.reply_token,
-                    messages=[TextMessage(text="ขออภัย ระบบวิเคราะห์รูปภาพขัดข้องชั่วคราว ลองใหม่อีกครั้งค่ะ")],
-                )
-            )
+        outcome = "error"
+        _reply(
+            event.reply_token,
+            [TextMessage(text="ขออภัย ระบบวิเคราะห์รูปภาพขัดข้องชั่วคราว ลองใหม่อีกครั้งค่ะ")],
+        )
     finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try:
-                os.remove(tmp_path)
-            except:
-                pass
-
-            try:
-                os.remove(tmp_path)
-            except:
-                pass
+        admission.done(event, time.perf_counter() - started)
+        metrics.end_trace(outcome)
@@ -0,0 +1,273 @@
+"""
+metrics เบา ๆ สำหรับ hot path: histogram / counter + หน้า /metrics แบบ Prometheus
+และบันทึกเวลาแต่ละ stage ต่อ event เป็น JSONL ผ่าน writer เบื้องหลัง (ไม่บล็อก handler)
+"""
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# ไฟล์ JSONL สำหรับ record ต่อ event (ว่าง = ไม่เขียน)
+METRICS_EVENT_LOG = os.getenv("METRICS_EVENT_LOG", "")
+METRICS_EVENT_LOG_BUFFER = int(os.getenv("METRICS_EVENT_LOG_BUFFER", "10000"))
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+CONFIDENCE_BUCKETS = (10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99, 100)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {v}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # counts ต่อ bucket (ไม่สะสม) + ช่องสุดท้ายสำหรับ +Inf, sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(c), s) for k, (c, s) in sorted(self._series.items())]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', bound))} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        m = Counter(name, help, labelnames)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        m = Histogram(name, help, buckets, labelnames)
+        self._metrics.append(m)
+        return m
+
+    def add_collector(self, prefix, fn, counters=()):
+        """
+        fn() คืน dict ของตัวเลข export เป็น <prefix>_<key>
+        - key ที่อยู่ใน counters (ยอดสะสมที่นับขึ้นอย่างเดียว) -> counter ชื่อ <prefix>_<key>_total
+        - ค่าที่เป็น dict {ขอบบน: จำนวน} (ไม่สะสม) -> histogram เช่นการกระจายขนาด batch
+        - ที่เหลือ -> gauge
+        """
+        self._collectors.append((prefix, fn, frozenset(counters)))
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        for prefix, fn, counters in self._collectors:
+            try:
+                values = fn() or {}
+            except Exception as e:
+                print("[METRICS] Collector error:", e)
+                continue
+            for k, v in values.items():
+                name = f"{prefix}_{k}"
+                if isinstance(v, dict):
+                    lines.extend(_render_histogram_dict(name, v))
+                    continue
+                if isinstance(v, bool):
+                    v = int(v)
+                if not isinstance(v, (int, float)):
+                    continue
+                if k in counters:
+                    lines.append(f"# TYPE {name}_total counter")
+                    lines.append(f"{name}_total {v}")
+                else:
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {v}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(v: float):
+    return int(v) if v.is_integer() else v
+
+
+def _render_histogram_dict(name, counts):
+    """{ขอบบน: จำนวน} -> บรรทัด histogram แบบ Prometheus (_bucket สะสม, _sum, _count)"""
+    try:
+        items = sorted((float(b), int(c)) for b, c in counts.items())
+    except (TypeError, ValueError):
+        return []
+    lines = [f"# TYPE {name} histogram"]
+    cumulative = 0
+    total = 0.0
+    for bound, c in items:
+        cumulative += c
+        total += bound * c
+        lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {cumulative}')
+    lines.append(f"{name}_sum {_number(total)}")
+    lines.append(f"{name}_count {cumulative}")
+    return lines
+
+
+class EventLogWriter:
+    """
+    เขียน record ต่อ event เป็น JSONL บน thread เบื้องหลัง
+    handler แค่ put_nowait ลงคิว ถ้าคิวเต็มจะทิ้ง record (นับไว้ใน dropped)
+    """
+
+    def __init__(self, path: str, max_buffer: int = 10000, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max(1, max_buffer))
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                try:
+                    record = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    f.flush()
+                    continue
+                batch = [record]
+                while len(batch) < 512:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch))
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "chillibot_stage_seconds", "Time spent in each hot-path stage", labelnames=("stage",)
+)
+EVENTS_TOTAL = registry.counter(
+    "chillibot_events_total", "Webhook events handled", labelnames=("type", "outcome")
+)
+PREDICTIONS_TOTAL = registry.counter(
+    "chillibot_predictions_total", "Predictions by class", labelnames=("class_id",)
+)
+PREDICTION_CONFIDENCE = registry.histogram(
+    "chillibot_prediction_confidence", "Top-1 confidence (%)", buckets=CONFIDENCE_BUCKETS
+)
+CASCADE_TOTAL = registry.counter(
+    "chillibot_cascade_total", "Images answered by the screening model vs escalated", labelnames=("stage",)
+)
+
+event_log = EventLogWriter(METRICS_EVENT_LOG, METRICS_EVENT_LOG_BUFFER) if METRICS_EVENT_LOG else None
+
+# trace ของ event ที่ thread นี้กำลังทำ (worker หนึ่งตัวทำทีละ event)
+_local = threading.local()
+
+
+@contextmanager
+def stage(name: str):
+    """จับเวลา stage -> histogram และใส่ลง trace ของ event ปัจจุบัน (ถ้ามี)"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=name)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            stages = trace["stages_ms"]
+            stages[name] = stages.get(name, 0.0) + dt * 1000.0
+
+
+def start_trace(kind: str, **fields):
+    _local.trace = {"type": kind, "ts": time.time(), "t0": time.perf_counter(), "stages_ms": {}, **fields}
+
+
+def annotate(**fields):
+    """เพิ่มข้อมูลลง trace ปัจจุบัน เช่น class_id / confidence"""
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.update(fields)
+
+
+def end_trace(outcome: str = "ok", **fields):
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is None:
+        return
+    EVENTS_TOTAL.inc(type=trace["type"], outcome=outcome)
+    trace.update(fields)
+    trace["outcome"] = outcome
+    trace["total_ms"] = (time.perf_counter() - trace.pop("t0")) * 1000.0
+    if event_log is not None:
+        event_log.write(trace)
+
+
+def observe_prediction(class_id, confidence):
+    PREDICTIONS_TOTAL.inc(class_id=class_id)
+    PREDICTION_CONFIDENCE.observe(confidence)
+    annotate(class_id=class_id, confidence=round(confidence, 2))
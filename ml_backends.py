@@ -0,0 +1,181 @@
+"""
+backend สำหรับรันโมเดล: ทุกตัวมี .predict(batch) รับ float32 (N x H x W x 3) คืน (N x classes)
+
+- keras  : tensorflow.keras (ไฟล์ .keras เดิม)
+- tflite : ไฟล์ .tflite จาก convert_model.py ใช้ tflite_runtime ถ้ามี ไม่งั้นใช้ tensorflow.lite
+- onnx   : ไฟล์ .onnx ผ่าน onnxruntime
+  (tflite-runtime / onnxruntime / tf2onnx อยู่ใน requirements-backends.txt ไม่ได้ติดตั้งเป็นค่าเริ่มต้น)
+- fake   : โมเดลจำลองแบบ deterministic ไม่ต้องมีไฟล์ (ใช้ใน benchmark/CI ที่ไม่มีโมเดลจริง)
+
+import ไลบรารีเฉพาะตอนสร้าง backend เพื่อไม่ให้ต้องโหลด tensorflow ทั้งก้อนถ้าไม่จำเป็น
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path: str, num_threads=None):
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+
+        if num_threads:
+            # ต้องตั้งก่อนสร้าง graph/โหลดโมเดล
+            tf.config.threading.set_intra_op_parallelism_threads(int(num_threads))
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        self.path = path
+        self.model = load_model(path)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    """
+    interpreter 1 ตัวต่อขนาด batch แบบ bucket (1, 2, 4, 8, ...) batch ที่ไม่เต็ม bucket จะเติม 0
+    สร้างตอนเจอขนาดนั้นครั้งแรก (warm-up สร้างไว้ก่อน) จึงไม่ต้อง resize + allocate_tensors ทุกครั้ง
+    ที่ขนาด batch เปลี่ยน ไฟล์โมเดลถูก mmap ใช้ร่วมกัน แต่ละ interpreter เพิ่มแค่ tensor arena
+    """
+    name = "tflite"
+
+    def __init__(self, path: str, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                import tensorflow as tf
+            except ImportError as e:
+                raise ImportError(
+                    "ML_BACKEND=tflite needs tflite-runtime or tensorflow "
+                    "(pip install -r requirements-backends.txt)"
+                ) from e
+            # tensorflow.lite เป็น lazy module: "from tensorflow.lite import Interpreter" ใช้ไม่ได้
+            Interpreter = tf.lite.Interpreter
+
+        self.path = path
+        self._make_interpreter = lambda: Interpreter(model_path=path, num_threads=num_threads)
+        # {ขนาด bucket: (interpreter, input detail, output detail)}
+        self._buckets = {}
+        # interpreter ไม่ thread-safe
+        self._lock = threading.Lock()
+        self._bucket(1)
+
+    @staticmethod
+    def bucket_size(n: int) -> int:
+        return 1 << max(0, n - 1).bit_length()
+
+    def _bucket(self, size: int):
+        slot = self._buckets.get(size)
+        if slot is None:
+            interpreter = self._make_interpreter()
+            detail = interpreter.get_input_details()[0]
+            if int(detail["shape"][0]) != size:
+                shape = list(detail["shape"])
+                shape[0] = size
+                interpreter.resize_tensor_input(detail["index"], shape)
+            interpreter.allocate_tensors()
+            slot = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0])
+            self._buckets[size] = slot
+        return slot
+
+    @staticmethod
+    def _quantize(x, detail):
+        scale, zero_point = detail["quantization"]
+        if not scale:
+            return x.astype(detail["dtype"])
+        info = np.iinfo(detail["dtype"])
+        q = np.round(x / scale + zero_point)
+        return np.clip(q, info.min, info.max).astype(detail["dtype"])
+
+    @staticmethod
+    def _dequantize(y, detail):
+        scale, zero_point = detail["quantization"]
+        if not scale:
+            return y.astype(np.float32)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch):
+        n = len(batch)
+        size = self.bucket_size(n)
+        with self._lock:
+            interpreter, inp, out = self._bucket(size)
+            x = batch
+            if size != n:
+                x = np.zeros((size,) + tuple(batch.shape[1:]), dtype=batch.dtype)
+                x[:n] = batch
+            if inp["dtype"] != np.float32:
+                x = self._quantize(x, inp)
+            interpreter.set_tensor(inp["index"], x)
+            interpreter.invoke()
+            y = interpreter.get_tensor(out["index"])[:n]
+            if out["dtype"] != np.float32:
+                y = self._dequantize(y, out)
+            return np.array(y, copy=True)
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path: str, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "ML_BACKEND=onnx needs onnxruntime (pip install -r requirements-backends.txt)"
+            ) from e
+
+        self.path = path
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(
+            path, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+class FakeBackend:
+    """
+    ตอบ class ตามค่าเฉลี่ยสีของภาพ (ภาพเดิมได้ผลเดิมเสมอ) ไม่ได้วินิจฉัยจริง
+    ML_FAKE_LATENCY_MS: เวลาที่หน่วงต่อ batch เพื่อจำลองต้นทุนของ forward pass
+    """
+    name = "fake"
+
+    def __init__(self, path: str = "", num_threads=None, num_classes: int = 7):
+        self.path = path
+        self.num_classes = num_classes
+        self.latency = float(os.getenv("ML_FAKE_LATENCY_MS", "0")) / 1000.0
+
+    def predict(self, batch):
+        if self.latency:
+            time.sleep(self.latency)
+        batch = np.asarray(batch, dtype=np.float32)
+        means = batch.reshape(len(batch), -1).mean(axis=1)
+        class_ids = (means * 255.0).astype(np.int64) % self.num_classes
+        probs = np.full((len(batch), self.num_classes), 0.02, dtype=np.float32)
+        probs[np.arange(len(batch)), class_ids] = 1.0 - 0.02 * (self.num_classes - 1)
+        return probs
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "tflite": TFLiteBackend,
+    "onnx": OnnxBackend,
+    "fake": FakeBackend,
+}
+
+
+def create_backend(name: str, path: str, num_threads=None):
+    name = (name or "keras").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ML backend '{name}' (use: {', '.join(BACKENDS)})")
+    if name != "fake" and not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return BACKENDS[name](path, num_threads=num_threads)
@@ -1,17 +1,124 @@
+import io
 import os
+import random
+import threading
+import time
 import requests
 import numpy as np
 from PIL import Image
-from tensorflow.keras.models import load_model
+
+from inference_engine import MicroBatcher
+from ml_backends import create_backend
+from model_artifacts import ArtifactManager, ArtifactError, load_manifest
+from model_registry import ModelRegistry, backend_for_path
+from inference_server import RemoteEngine, default_addresses
+import metrics
+from prediction_cache import PredictionCache, content_key, perceptual_key
 
 # ===== ตั้งค่าโมเดล =====
 MODEL_PATH = "ChiliDisease7_finetune.keras"
 
-# URL ของไฟล์โมเดลบน GitHub Release
-GITHUB_MODEL_URL = "https://github.com/tukkytk/ChilliBot-AI/releases/download/chilli/ChiliDisease7_finetune.keras"
+# URL ของไฟล์โมเดลบน GitHub Release (ตั้ง ML_MODEL_URL="" เพื่อไม่ดาวน์โหลด เช่นตอนรัน benchmark แบบ offline)
+# ค่าใน env มาก่อน manifest (model_manifest.json)
+GITHUB_MODEL_URL = os.getenv(
+    "ML_MODEL_URL",
+    "https://github.com/tukkytk/ChilliBot-AI/releases/download/chilli/ChiliDisease7_finetune.keras",
+)
+
+# cache ของไฟล์โมเดล (ใช้ร่วมกันทุก worker บนเครื่องเดียวกัน) + manifest ที่ระบุ sha256
+ML_ARTIFACT_DIR = os.getenv(
+    "ML_ARTIFACT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "chillibot", "models")
+)
+ML_MODEL_MANIFEST = os.getenv("ML_MODEL_MANIFEST", "model_manifest.json")
+ML_MODEL_SHA256 = os.getenv("ML_MODEL_SHA256", "")
+
+# ===== เลือก backend: keras (ค่าเดิม) | tflite | onnx | fake =====
+# ไฟล์ .tflite / .onnx สร้างจาก .keras ด้วย: python convert_model.py --help
+# fake = โมเดลจำลองไม่ต้องมีไฟล์ ใช้รัน benchmark/CI เท่านั้น (ผลไม่ใช่การวินิจฉัยจริง)
+ML_BACKEND = os.getenv("ML_BACKEND", "keras").lower()
+ML_TFLITE_PATH = os.getenv("ML_TFLITE_PATH", "ChiliDisease7_finetune.tflite")
+ML_ONNX_PATH = os.getenv("ML_ONNX_PATH", "ChiliDisease7_finetune.onnx")
+ML_NUM_THREADS = int(os.getenv("ML_NUM_THREADS", "0")) or None
+
+# ===== local = โหลดโมเดลใน process นี้, server = ใช้ inference_server.py ที่รันแยก =====
+ML_INFERENCE_MODE = os.getenv("ML_INFERENCE_MODE", "local").lower()
+ML_INFERENCE_CONNECT_TIMEOUT = float(os.getenv("ML_INFERENCE_CONNECT_TIMEOUT", "600"))
+
+# ===== cascade: โมเดลเล็กคัดกรองก่อน ถ้ามั่นใจไม่ถึง threshold (%) ค่อยใช้โมเดลเต็ม =====
+# ML_SCREEN_MODEL_PATH ว่าง = ไม่ใช้ cascade, backend เลือกจากนามสกุลไฟล์ (.keras/.tflite/.onnx)
+ML_SCREEN_MODEL_PATH = os.getenv("ML_SCREEN_MODEL_PATH", "")
+ML_SCREEN_SIZE = int(os.getenv("ML_SCREEN_SIZE", "128"))
+ML_SCREEN_THRESHOLD = float(os.getenv("ML_SCREEN_THRESHOLD", "90"))
+
+# ===== ตั้งค่า micro-batching (รวมภาพที่เข้ามาพร้อมกันเป็น batch เดียว) =====
+ML_MAX_BATCH_SIZE = int(os.getenv("ML_MAX_BATCH_SIZE", "8"))
+ML_MAX_BATCH_WAIT_MS = float(os.getenv("ML_MAX_BATCH_WAIT_MS", "10"))
+
+# ขนาด input ของโมเดล
+IMG_SIZE = (224, 224)
+
+# ขนาด batch ที่ใช้ warm-up ก่อนประกาศว่าพร้อม (ว่าง = 1 และ ML_MAX_BATCH_SIZE)
+ML_WARMUP_BATCH_SIZES = os.getenv("ML_WARMUP_BATCH_SIZES", "")
+
+# ===== ตั้งค่า cache ผลวิเคราะห์ (ภาพซ้ำ/ส่งต่อ ไม่ต้อง predict ใหม่) =====
+# PRED_CACHE_SIZE=0 คือปิด cache, PRED_CACHE_MODE = sha256 | phash
+PRED_CACHE_SIZE = int(os.getenv("PRED_CACHE_SIZE", "1024"))
+PRED_CACHE_TTL = float(os.getenv("PRED_CACHE_TTL", "86400"))
+PRED_CACHE_MODE = os.getenv("PRED_CACHE_MODE", "sha256")
+PRED_CACHE_PATH = os.getenv("PRED_CACHE_PATH", "")
+# จำนวนแถวสูงสุดของ cache บนดิสก์ (PRED_CACHE_PATH) 0 = ไม่จำกัด
+PRED_CACHE_DISK_MAX = int(os.getenv("PRED_CACHE_DISK_MAX", "100000"))
+
+# เวอร์ชันโมเดล (ว่าง = คำนวณจากขนาด/เวลาแก้ไขไฟล์โมเดล)
+ML_MODEL_VERSION = os.getenv("ML_MODEL_VERSION", "")
+
+# ===== hot-swap: registry ของโมเดลแบบมีเวอร์ชัน + เปลี่ยนโมเดลโดยไม่ต้อง restart =====
+# ML_REGISTRY_DIR ว่าง = ไม่ใช้ registry (ใช้ MODEL_PATH / ML_BACKEND แบบเดิม) ดู model_registry.py
+ML_REGISTRY_DIR = os.getenv("ML_REGISTRY_DIR", "")
+# ML_RELOAD_WATCH=1: ตรวจ registry.json (หรือไฟล์โมเดล) ทุก ML_RELOAD_POLL_SECONDS แล้ว reload เอง
+ML_RELOAD_WATCH = os.getenv("ML_RELOAD_WATCH", "0") == "1"
+ML_RELOAD_POLL_SECONDS = float(os.getenv("ML_RELOAD_POLL_SECONDS", "10"))
+# หลังสลับโมเดล รอ request ที่ยังใช้เวอร์ชันเดิมอยู่ก่อนปิด engine เดิม (วินาที)
+ML_SWAP_GRACE_SECONDS = float(os.getenv("ML_SWAP_GRACE_SECONDS", "30"))
+# shadow mode: สัดส่วนภาพที่ส่งให้ candidate ด้วย (ใช้เทียบผล/เวลา ไม่ได้ใช้ตอบผู้ใช้)
+ML_SHADOW_SAMPLE = float(os.getenv("ML_SHADOW_SAMPLE", "0.1"))
+
+# ===== สถานะการโหลดโมเดล =====
+STATE_IDLE = "idle"
+STATE_DOWNLOADING = "downloading"
+STATE_LOADING = "loading"
+STATE_WARMING = "warming"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+STATE_SHADOW = "shadow"
 
 model = None
 MODEL_READY = False
+MODEL_STATE = STATE_IDLE
+MODEL_ERROR = ""
+MODEL_VERSION = ""
+# ไม่ว่าง = ไม่ได้ใช้ backend ที่ตั้งไว้ (แสดงใน /ready และ /admin/model)
+BACKEND_WARNING = ""
+engine = None
+cache = None
+screen_model = None
+screen_engine = None
+
+artifacts = ArtifactManager(ML_ARTIFACT_DIR)
+registry = ModelRegistry(ML_REGISTRY_DIR) if ML_REGISTRY_DIR else None
+
+# โมเดลที่ใช้ตอบอยู่ / candidate ใน shadow mode (_Serving)
+_active = None
+_shadow = None
+RELOAD_STATE = STATE_IDLE
+RELOAD_ERROR = ""
+_reload_lock = threading.Lock()
+_reload_thread = None
+_watch_thread = None
+
+_load_thread = None
+_load_started_at = None
+_load_finished_at = None
 
 # ===== ข้อมูลโรค: ตั้งตาม class ที่โมเดลของคุณเทรนไว้ =====
 # class_id 0–6 ให้ปรับชื่อโรค/รายละเอียด/คำแนะนำ/ลิงก์/รูปตามจริงได้เลย
@@ -118,64 +225,711 @@ DISEASE_INFO = {
 }
 
 
-def download_model():
-    """ดาวน์โหลดโมเดลจาก GitHub Release ถ้ายังไม่มีไฟล์"""
-    if os.path.exists(MODEL_PATH):
-        print(f"[ML] Model file '{MODEL_PATH}' already exists. Skip download.")
-        return
+class _ShadowStats:
+    """เทียบโมเดล candidate กับโมเดลหลักบน traffic จริง (เฉพาะภาพที่ถูกสุ่ม)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.agree = 0
+        self.errors = 0
+        self.primary_seconds = 0.0
+        self.candidate_seconds = 0.0
+
+    def record(self, agree: bool, primary_seconds: float, candidate_seconds: float):
+        with self._lock:
+            self.samples += 1
+            self.agree += int(agree)
+            self.primary_seconds += primary_seconds
+            self.candidate_seconds += candidate_seconds
 
-    if not GITHUB_MODEL_URL:
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = self.samples
+            return {
+                "samples": n,
+                "agreement_rate": (self.agree / n) if n else 0.0,
+                "errors": self.errors,
+                "primary_ms": (self.primary_seconds / n * 1000.0) if n else 0.0,
+                "candidate_ms": (self.candidate_seconds / n * 1000.0) if n else 0.0,
+            }
+
+
+class _Serving:
+    """
+    โมเดล 1 เวอร์ชันที่พร้อมใช้: backend + MicroBatcher + cache
+    hot-swap คือเปลี่ยน _active ทั้งก้อน predict_image อ่าน _active ครั้งเดียวต่อ request
+    จึงไม่มี request ไหนใช้ engine ของเวอร์ชันหนึ่งกับ cache ของอีกเวอร์ชัน
+    """
+
+    def __init__(self, backend, engine, version: str, path: str = "", source: str = ""):
+        self.backend = backend
+        self.engine = engine
+        self.version = version
+        self.path = path
+        # สิ่งที่ watcher ใช้เทียบว่าโมเดลเปลี่ยนหรือยัง (registry:<version> / file:<ขนาด:mtime>)
+        self.source = source
+        self.cache = None
+        self.shadow_stats = _ShadowStats()
+        # ชื่อ stage ของ forward pass ใน metrics (shadow_forward จนกว่าจะถูก promote)
+        self.stage = "model_forward"
+
+    def forward(self, batch):
+        return _predict_batch(self.backend, batch, self.stage)
+
+
+def _model_entry():
+    """url / sha256 / version ของไฟล์ .keras จาก manifest (ถ้ามี) และ env"""
+    entry = load_manifest(ML_MODEL_MANIFEST).get(os.path.basename(MODEL_PATH), {})
+    return {
+        "url": GITHUB_MODEL_URL if "ML_MODEL_URL" in os.environ else (entry.get("url") or GITHUB_MODEL_URL),
+        "sha256": (ML_MODEL_SHA256 or entry.get("sha256", "")).lower(),
+        "version": entry.get("version", ""),
+    }
+
+
+def download_model(on_state=None):
+    """ดาวน์โหลดโมเดลจาก GitHub Release ลง cache (ถ้ายังไม่มี) คืน path ของไฟล์ที่ตรวจแล้ว"""
+    entry = _model_entry()
+
+    if entry["sha256"]:
+        # ไฟล์ในโฟลเดอร์โปรเจกต์ (เช่นตอน dev) ใช้ได้เลยถ้า checksum ผ่าน
+        if artifacts.is_valid(MODEL_PATH, entry["sha256"]):
+            print(f"[ML] Model file '{MODEL_PATH}' already exists. Skip download.")
+            return MODEL_PATH
+    elif os.path.exists(MODEL_PATH):
+        if not entry["url"]:
+            # ไม่มีทั้ง checksum และ URL: ใช้ไฟล์ในโฟลเดอร์ตามที่ตั้งใจ (ตรวจไม่ได้ว่าไฟล์ครบ)
+            print(f"[ML WARNING] Using unverified model file '{MODEL_PATH}' (no sha256 in manifest).")
+            return MODEL_PATH
+        # ไม่มี checksum: เทียบขนาดกับไฟล์บน Release แทน (ไฟล์ที่ค้างครึ่งไฟล์จะเล็กกว่า)
+        local_size = os.path.getsize(MODEL_PATH)
+        remote_size = artifacts.remote_size(entry["url"])
+        if remote_size is None:
+            print(f"[ML WARNING] No sha256 and cannot reach the release to check its size; "
+                  f"using unverified model file '{MODEL_PATH}'.")
+            return MODEL_PATH
+        if remote_size == local_size:
+            print(f"[ML] Model file '{MODEL_PATH}' matches the release size ({local_size} bytes). Skip download.")
+            return MODEL_PATH
+        print(f"[ML WARNING] Model file '{MODEL_PATH}' is {local_size} bytes but the release is "
+              f"{remote_size} bytes; downloading the release without a sha256 to verify it.")
+
+    if not entry["url"]:
         print("[ML] GITHUB_MODEL_URL is not set. Running in NO-ML mode.")
+        return None
+
+    name = os.path.basename(MODEL_PATH)
+    cached = artifacts.path_for(name, entry["version"] or entry["sha256"][:12])
+    if not artifacts.is_valid(cached, entry["sha256"]):
+        (on_state or _set_state)(STATE_DOWNLOADING)
+        print("[ML] Downloading model from GitHub Release...")
+        if not entry["sha256"]:
+            print("[ML WARNING] No sha256 in the manifest; the download is only checked against Content-Length.")
+    try:
+        return artifacts.fetch(entry["url"], name, entry["sha256"], entry["version"])
+    except (ArtifactError, requests.RequestException, OSError) as e:
+        print("[ML ERROR] Failed to download model:", e)
+        return None
+
+
+def _backend_artifact():
+    """คืน (ชื่อ backend, path ของไฟล์) ถ้าไม่มีไฟล์ของ backend ที่เลือก จะกลับไปใช้ keras"""
+    global BACKEND_WARNING
+    BACKEND_WARNING = ""
+    if ML_BACKEND == "tflite":
+        path = ML_TFLITE_PATH
+    elif ML_BACKEND == "onnx":
+        path = ML_ONNX_PATH
+    else:
+        return "keras", MODEL_PATH
+
+    if os.path.exists(path):
+        return ML_BACKEND, path
+    BACKEND_WARNING = (
+        f"ML_BACKEND={ML_BACKEND} but '{path}' not found, using keras "
+        "(slower, loads tensorflow; build it with convert_model.py)"
+    )
+    print("[ML WARNING] " + "!" * 60)
+    print(f"[ML WARNING] {BACKEND_WARNING}")
+    print("[ML WARNING] " + "!" * 60)
+    return "keras", MODEL_PATH
+
+
+def _resolve_artifact(version=None, on_state=None):
+    """
+    เลือกไฟล์โมเดลที่จะโหลด คืน (backend, path, version, source) หรือ None
+    มี registry: ใช้เวอร์ชันที่ระบุ (หรือ active) ไม่งั้นใช้ MODEL_PATH / ML_BACKEND แบบเดิม
+    """
+    if registry is not None:
+        version = version or registry.active()
+        if version:
+            entry = registry.get(version)
+            if entry is None:
+                raise KeyError(f"model version '{version}' is not registered")
+            if not artifacts.is_valid(entry["path"], entry["sha256"]):
+                raise ArtifactError(f"checksum mismatch for model version '{version}'")
+            return entry["backend"], entry["path"], version, f"registry:{version}"
+    elif version:
+        raise KeyError("ML_REGISTRY_DIR is not set")
+
+    if ML_BACKEND == "fake":
+        return "fake", "", ML_MODEL_VERSION or "fake:1", "fake"
+
+    backend, path = _backend_artifact()
+    if backend == "keras":
+        path = download_model(on_state)
+    if not path or not os.path.exists(path):
+        return None
+    sha = _model_entry()["sha256"] if backend == "keras" else ""
+    version = ML_MODEL_VERSION or f"{backend}:{sha[:12] or _file_version(path)}"
+    return backend, path, version, f"file:{_file_version(path)}"
+
+
+def _set_state(state: str, error: str = ""):
+    global MODEL_STATE, MODEL_ERROR, _load_finished_at
+    MODEL_STATE = state
+    MODEL_ERROR = error
+    if state in (STATE_READY, STATE_FAILED):
+        _load_finished_at = time.time()
+    print(f"[ML] State -> {state}" + (f" ({error})" if error else ""))
+
+
+def _set_reload_state(state: str, error: str = ""):
+    global RELOAD_STATE, RELOAD_ERROR
+    RELOAD_STATE = state
+    RELOAD_ERROR = error
+    print(f"[ML] Reload state -> {state}" + (f" ({error})" if error else ""))
+
+
+def _warmup_sizes():
+    if ML_WARMUP_BATCH_SIZES.strip():
+        sizes = [int(v) for v in ML_WARMUP_BATCH_SIZES.split(",") if v.strip()]
+    else:
+        sizes = [1, ML_MAX_BATCH_SIZE]
+    return sorted({max(1, min(n, ML_MAX_BATCH_SIZE)) for n in sizes})
+
+
+def _warmup(backend, size=IMG_SIZE):
+    """รัน forward pass ที่ขนาด batch จริง เพื่อให้ graph/allocation เกิดก่อนรับงานจริง"""
+    sizes = _warmup_sizes()
+    if hasattr(backend, "bucket_size"):
+        # tflite: สร้าง interpreter ของทุก bucket ที่ MicroBatcher อาจใช้
+        sizes = sorted({backend.bucket_size(n) for n in range(1, ML_MAX_BATCH_SIZE + 1)})
+    for n in sizes:
+        t0 = time.perf_counter()
+        backend.predict(np.zeros((n,) + tuple(size) + (3,), dtype=np.float32))
+        print(f"[ML] Warm-up batch={n} took {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+def _load_screen_model():
+    """โหลดโมเดลคัดกรอง (ถ้าตั้งค่าไว้) ถ้าโหลดไม่ได้จะใช้โมเดลเต็มอย่างเดียว"""
+    global screen_model, screen_engine
+    if not ML_SCREEN_MODEL_PATH:
         return
+    try:
+        backend = backend_for_path(ML_SCREEN_MODEL_PATH)
+        print(f"[ML] Loading screening {backend} model from {ML_SCREEN_MODEL_PATH}")
+        screen_model = create_backend(backend, ML_SCREEN_MODEL_PATH, num_threads=ML_NUM_THREADS)
+        _warmup(screen_model, (ML_SCREEN_SIZE, ML_SCREEN_SIZE))
+        screen_engine = MicroBatcher(
+            _predict_screen_batch,
+            max_batch_size=ML_MAX_BATCH_SIZE,
+            max_wait_ms=ML_MAX_BATCH_WAIT_MS,
+            input_scale=1.0 / 255.0,
+        )
+    except Exception as e:
+        print("[ML ERROR] Failed to load screening model, cascade disabled:", e)
+        screen_model = None
+        screen_engine = None
+
+
+def _make_cache(version: str):
+    if PRED_CACHE_SIZE <= 0:
+        return None
+    if screen_engine is not None:
+        # ผลจาก cascade ขึ้นกับโมเดลคัดกรองและ threshold ด้วย
+        version += f"+screen:{os.path.basename(ML_SCREEN_MODEL_PATH)}@{ML_SCREEN_THRESHOLD:g}"
+    return PredictionCache(
+        max_entries=PRED_CACHE_SIZE,
+        ttl=PRED_CACHE_TTL,
+        path=PRED_CACHE_PATH or None,
+        version=version,
+        max_disk_entries=PRED_CACHE_DISK_MAX,
+    )
+
+
+def _build_serving(backend, path, version, source, on_state=_set_state, stage="model_forward"):
+    """โหลด + warm-up โมเดลจากไฟล์ ยังไม่ถูกใช้ตอบจนกว่าจะ _activate"""
+    on_state(STATE_LOADING)
+    print(f"[ML] Loading {backend} model from {path} (version {version})")
+    loaded = create_backend(backend, path, num_threads=ML_NUM_THREADS)
+
+    on_state(STATE_WARMING)
+    _warmup(loaded)
+
+    serving = _Serving(loaded, None, version, path, source)
+    serving.stage = stage
+    serving.engine = MicroBatcher(
+        serving.forward,
+        max_batch_size=ML_MAX_BATCH_SIZE,
+        max_wait_ms=ML_MAX_BATCH_WAIT_MS,
+        input_scale=1.0 / 255.0,
+    )
+    return serving
+
+
+def _close_serving(serving):
+    serving.engine.close()
+    if serving.cache is not None:
+        serving.cache.close()
+
+
+def _retire(serving):
+    """ปิด engine และ cache ของเวอร์ชันเก่าหลัง request ที่ยังใช้อยู่จบ (ML_SWAP_GRACE_SECONDS)"""
+    timer = threading.Timer(ML_SWAP_GRACE_SECONDS, _close_serving, args=(serving,))
+    timer.daemon = True
+    timer.start()
+
+
+def _activate(serving):
+    """
+    ให้ serving เป็นโมเดลที่ใช้ตอบ (สลับ reference เดียว) แล้วเลิกใช้เวอร์ชันเดิม
+    ถ้าก่อนหน้านี้โหลดไม่สำเร็จ (failed) สถานะจะกลับเป็น ready ด้วย
+    """
+    global _active, model, engine, cache, MODEL_VERSION, MODEL_READY
+    if serving.cache is None:
+        serving.cache = _make_cache(serving.version)
+    serving.stage = "model_forward"
+    old = _active
+    _active = serving
+    model, engine, cache, MODEL_VERSION = serving.backend, serving.engine, serving.cache, serving.version
+    MODEL_READY = True
+    if MODEL_STATE != STATE_READY:
+        _set_state(STATE_READY)
+    if old is not None and old is not serving:
+        _retire(old)
+
+
+def _connect_inference_server():
+    """โหมด server: รอจน inference worker พร้อม แล้วใช้ RemoteEngine แทนการโหลดโมเดลเอง"""
+    _set_state(STATE_LOADING)
+    remote = RemoteEngine(default_addresses())
+    deadline = time.monotonic() + ML_INFERENCE_CONNECT_TIMEOUT
+    while True:
+        try:
+            info = remote.connect()
+            break
+        except ConnectionError as e:
+            if time.monotonic() > deadline:
+                _set_state(STATE_FAILED, str(e))
+                return
+            time.sleep(1.0)
 
-    print("[ML] Downloading model from GitHub Release...")
     try:
-        with requests.get(GITHUB_MODEL_URL, stream=True, timeout=600) as r:
-            r.raise_for_status()
-            total = 0
-            with open(MODEL_PATH, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        total += len(chunk)
-        print(f"[ML] Model downloaded successfully. Size: {total / (1024*1024):.2f} MB")
+        _set_state(STATE_WARMING)
+        remote.predict(np.zeros(IMG_SIZE + (3,), dtype=np.uint8))
+        _load_screen_model()
+        version = ML_MODEL_VERSION or str(info.get("version", ""))
+        _activate(_Serving(None, remote, version, source="server"))
+        print(f"[ML] Using inference server {remote.addresses}")
     except Exception as e:
-        print("[ML ERROR] Failed to download model:", e)
+        print("[ML ERROR] Inference server warm-up failed:", e)
+        _set_state(STATE_FAILED, str(e))
 
 
 def load_ml_model():
     """โหลดโมเดลจากไฟล์"""
-    global model, MODEL_READY
+    global model, MODEL_READY, _load_started_at
 
-    download_model()
+    _load_started_at = time.time()
+    MODEL_READY = False
 
-    if not os.path.exists(MODEL_PATH):
-        print(f"[ML] Model file '{MODEL_PATH}' not found. Running in NO-ML mode.")
-        MODEL_READY = False
-        model = None
+    if ML_INFERENCE_MODE == "server":
+        _connect_inference_server()
         return
 
     try:
-        print(f"[ML] Loading model from {MODEL_PATH}")
-        model = load_model(MODEL_PATH)
-        MODEL_READY = True
+        artifact = _resolve_artifact()
+        if artifact is None:
+            print("[ML] Model file not found. Running in NO-ML mode.")
+            model = None
+            _set_state(STATE_FAILED, "model file not found")
+            return
+
+        serving = _build_serving(*artifact)
+        _load_screen_model()
+        _activate(serving)
         print("[ML] Model Loaded Successfully.")
     except Exception as e:
         print("[ML ERROR] Failed to load model:", e)
         MODEL_READY = False
         model = None
+        _set_state(STATE_FAILED, str(e))
+
 
+def start_model_loading():
+    """โหลดโมเดลใน background thread (เรียกครั้งเดียวตอน startup ซ้ำได้ไม่มีผล)"""
+    global _load_thread
+    if _load_thread is not None:
+        return _load_thread
+    _load_thread = threading.Thread(target=load_ml_model, name="ml-loader", daemon=True)
+    _load_thread.start()
+    if ML_RELOAD_WATCH:
+        start_model_watch()
+    return _load_thread
 
-def _preprocess_image(image_path: str, target_size=(224, 224)):
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize(target_size)
-    arr = np.array(img, dtype=np.float32) / 255.0
-    arr = np.expand_dims(arr, axis=0)
-    return arr
+
+def _reload(version, shadow):
+    global _shadow
+    try:
+        _set_reload_state(STATE_LOADING)
+        artifact = _resolve_artifact(version, on_state=_set_reload_state)
+        if artifact is None:
+            raise FileNotFoundError("model file not found")
+        backend, path, new_version, source = artifact
+
+        current = _active
+        if current is not None and new_version == current.version:
+            if source == current.source:
+                print(f"[ML] Version {new_version} is already serving. Skip reload.")
+                _set_reload_state(STATE_IDLE)
+                return
+            # ไฟล์เปลี่ยนแต่ชื่อเวอร์ชันเดิม (เช่นตั้ง ML_MODEL_VERSION ไว้) กันผลเก่าใน cache
+            new_version += "@" + _file_version(path)
+
+        stage = "shadow_forward" if shadow else "model_forward"
+        candidate = _build_serving(backend, path, new_version, source, _set_reload_state, stage)
+        if shadow:
+            old, _shadow = _shadow, candidate
+            if old is not None:
+                _retire(old)
+            _set_reload_state(STATE_SHADOW)
+            print(f"[ML] Shadowing {new_version} on {ML_SHADOW_SAMPLE * 100:g}% of traffic")
+        else:
+            _activate(candidate)
+            _set_reload_state(STATE_IDLE)
+            print(f"[ML] Swapped to model version {new_version}")
+    except Exception as e:
+        print("[ML ERROR] Reload failed, keep serving current model:", e)
+        _set_reload_state(STATE_FAILED, str(e))
 
 
-def predict_image(image_path: str):
+def reload_model(version=None, shadow: bool = False) -> bool:
+    """
+    โหลดโมเดลใหม่เบื้องหลังโดยยังตอบด้วยโมเดลเดิม พร้อมแล้วค่อยสลับ
+    shadow=True: ยังไม่สลับ แต่ส่งภาพ ML_SHADOW_SAMPLE ส่วนไปให้ candidate เพื่อเทียบผล/เวลา
+    คืน False ถ้ากำลังโหลด/reload อยู่แล้ว
     """
+    global _reload_thread
+    if ML_INFERENCE_MODE == "server":
+        raise RuntimeError("restart inference_server.py to change the model in server mode")
+    with _reload_lock:
+        if is_model_loading() or (_reload_thread is not None and _reload_thread.is_alive()):
+            return False
+        _reload_thread = threading.Thread(
+            target=_reload, args=(version, shadow), name="ml-reloader", daemon=True
+        )
+        _reload_thread.start()
+    return True
+
+
+def end_shadow(promote: bool) -> bool:
+    """จบ shadow mode: promote = สลับไปใช้ candidate, ไม่งั้นทิ้ง candidate"""
+    global _shadow
+    with _reload_lock:
+        candidate, _shadow = _shadow, None
+    if candidate is None:
+        return False
+    if promote:
+        _activate(candidate)
+        print(f"[ML] Promoted shadow model {candidate.version}")
+    else:
+        _retire(candidate)
+        print(f"[ML] Discarded shadow model {candidate.version}")
+    _set_reload_state(STATE_IDLE)
+    return True
+
+
+def _watch_source() -> str:
+    if registry is not None and registry.active():
+        return f"registry:{registry.active()}"
+    current = _active
+    if current is None or not current.path:
+        return ""
+    try:
+        return f"file:{_file_version(current.path)}"
+    except OSError:
+        # ไฟล์กำลังถูกแทนที่ รอรอบถัดไป
+        return ""
+
+
+def _watch_loop():
+    triggered = ""
+    watched = ""
+    while True:
+        time.sleep(ML_RELOAD_POLL_SECONDS)
+        current = _active
+        if is_model_loading():
+            continue
+        # ไม่มี registry: ดูไฟล์ที่โหลดมาจริง (อาจเป็นสำเนาใน download cache ไม่ใช่ MODEL_PATH)
+        if registry is None and current is not None and current.path and current.path != watched:
+            watched = current.path
+            print(f"[ML] Watching model file '{watched}' for changes.")
+        # ไม่มีโมเดลที่ใช้อยู่ (โหลดตอนเริ่มไม่สำเร็จ) ก็ reload ได้ถ้า registry มีเวอร์ชันใหม่
+        source = _watch_source()
+        if source and source != (current.source if current is not None else "") and source != triggered:
+            print(f"[ML] Model change detected ({source}). Reloading in background.")
+            if reload_model():
+                triggered = source
+
+
+def start_model_watch():
+    """ตรวจ registry.json / ไฟล์โมเดลเป็นระยะ แล้ว reload เองเมื่อเปลี่ยน"""
+    global _watch_thread
+    if _watch_thread is None:
+        _watch_thread = threading.Thread(target=_watch_loop, name="ml-watch", daemon=True)
+        _watch_thread.start()
+    return _watch_thread
+
+
+def is_model_loading() -> bool:
+    """True ระหว่างดาวน์โหลด/โหลด/warm-up (ยังไม่พร้อม แต่กำลังจะพร้อม)"""
+    return MODEL_STATE in (STATE_IDLE, STATE_DOWNLOADING, STATE_LOADING, STATE_WARMING)
+
+
+def get_model_state():
+    started = _load_started_at
+    finished = _load_finished_at if MODEL_STATE in (STATE_READY, STATE_FAILED) else None
+    shadow = _shadow
+    return {
+        "state": MODEL_STATE,
+        "ready": MODEL_STATE == STATE_READY,
+        "error": MODEL_ERROR,
+        "version": MODEL_VERSION,
+        "load_seconds": ((finished or time.time()) - started) if started else None,
+        "reload": {"state": RELOAD_STATE, "error": RELOAD_ERROR},
+        "shadow_version": shadow.version if shadow is not None else None,
+        "backend_warning": BACKEND_WARNING,
+    }
+
+
+def get_shadow_stats():
+    """ผลเทียบ candidate กับโมเดลหลัก (ว่าง = ไม่ได้อยู่ใน shadow mode)"""
+    shadow = _shadow
+    if shadow is None:
+        return {}
+    return shadow.shadow_stats.snapshot()
+
+
+def _predict_batch(backend, batch, stage="model_forward"):
+    """forward pass ของทั้ง batch (ถูกเรียกจาก thread ของ MicroBatcher)"""
+    with metrics.stage(stage):
+        return backend.predict(batch)
+
+
+def _predict_screen_batch(batch):
+    with metrics.stage("screen_forward"):
+        return screen_model.predict(batch)
+
+
+def _file_version(path: str) -> str:
+    st = os.stat(path)
+    return f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def get_cache_stats():
+    """จำนวน hit/miss ของ cache ผลวิเคราะห์"""
+    if cache is None:
+        return {}
+    return cache.stats()
+
+
+def get_cascade_stats():
+    """อัตราที่โมเดลคัดกรองตอบเองได้ / ต้องส่งต่อโมเดลเต็ม"""
+    if screen_engine is None:
+        return {}
+    screened = metrics.CASCADE_TOTAL.value(stage="screen")
+    escalated = metrics.CASCADE_TOTAL.value(stage="escalated")
+    total = screened + escalated
+    return {
+        "threshold": ML_SCREEN_THRESHOLD,
+        "screened": screened,
+        "escalated": escalated,
+        "escalation_rate": (escalated / total) if total else 0.0,
+    }
+
+
+def get_batch_stats():
+    """การกระจายขนาด batch ของ inference engine (ใช้ปรับค่าให้เข้ากับ traffic จริง)"""
+    if engine is None:
+        return {}
+    return engine.stats()
+
+
+def _open_image(source):
+    """เปิดภาพจาก path, bytes/bytearray/memoryview หรือ file-like object โดยไม่ผ่านดิสก์"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    if hasattr(source, "read"):
+        return Image.open(source)
+    return Image.open(os.fspath(source))
+
+
+def _read_bytes(source) -> bytes:
+    """อ่านภาพเป็น bytes (ใช้ทำ key ของ cache)"""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    with open(os.fspath(source), "rb") as f:
+        return f.read()
+
+
+def _decode_image(source, target_size=IMG_SIZE):
+    img = _open_image(source)
+    # JPEG: decode ที่ความละเอียดลดลง (1/2, 1/4, 1/8) แต่ไม่ต่ำกว่า target_size
+    img.draft("RGB", target_size)
+    return img.convert("RGB")
+
+
+def _to_input(img, target_size=IMG_SIZE):
+    """resize เป็น uint8 (H x W x 3) การหาร 255 ทำตอนคัดลอกลง input tensor ของ MicroBatcher"""
+    if img.size != target_size:
+        img = img.resize(target_size)
+    return np.asarray(img, dtype=np.uint8)
+
+
+def _preprocess_image(source, target_size=IMG_SIZE):
+    """decode + resize เป็น uint8 (H x W x 3)"""
+    return _to_input(_decode_image(source, target_size), target_size)
+
+
+def _cache_key(data: bytes, img=None):
+    if PRED_CACHE_MODE == "phash":
+        if img is None:
+            img = _decode_image(data)
+        return perceptual_key(img), img
+    return content_key(data), img
+
+
+def _cascade_predict(imgs, full_engine, seconds=None):
+    """
+    ลองโมเดลคัดกรองก่อน (ถ้ามี) ภาพที่มั่นใจไม่ถึง ML_SCREEN_THRESHOLD จึงใช้โมเดลเต็ม
+    ส่งทุกภาพเข้า MicroBatcher ติดกันก่อนค่อยรอผล ภาพชุดเดียวกันจึงได้ forward pass เดียว
+    seconds (list ยาวเท่า imgs) ถ้าส่งมา จะได้เวลาที่แต่ละภาพได้ผล นับจากเริ่มเรียก
+    """
+    t0 = time.perf_counter()
+    preds = [None] * len(imgs)
+    pending = list(range(len(imgs)))
+    if screen_engine is not None:
+        with metrics.stage("screen"):
+            size = (ML_SCREEN_SIZE, ML_SCREEN_SIZE)
+            futures = [screen_engine.submit(_to_input(img, size)) for img in imgs]
+            screened = [f.result() for f in futures]
+        pending = []
+        for i, p in enumerate(screened):
+            if float(np.max(p) * 100.0) >= ML_SCREEN_THRESHOLD:
+                metrics.CASCADE_TOTAL.inc(stage="screen")
+                preds[i] = p
+                if seconds is not None:
+                    seconds[i] = time.perf_counter() - t0
+            else:
+                metrics.CASCADE_TOTAL.inc(stage="escalated")
+                pending.append(i)
+        metrics.annotate(cascade="escalated" if pending else "screen")
+        if not pending:
+            return preds
+
+    with metrics.stage("preprocess"):
+        xs = [_to_input(imgs[i]) for i in pending]
+    with metrics.stage("inference"):
+        futures = [full_engine.submit(x) for x in xs]
+        for i, f in zip(pending, futures):
+            preds[i] = f.result()
+            if seconds is not None:
+                seconds[i] = time.perf_counter() - t0
+    return preds
+
+
+def _shadow_compare(shadow, img, class_id, primary_seconds):
+    """ส่งภาพให้ candidate โดยไม่รอผล แล้วจดว่าตรงกับโมเดลหลักไหม และใช้เวลาเท่าไร"""
+    t0 = time.perf_counter()
+    try:
+        fut = shadow.engine.submit(_to_input(img))
+    except RuntimeError:
+        # candidate ถูกทิ้ง/promote ไประหว่างนี้
+        return
+
+    def done(f):
+        if f.exception() is not None:
+            shadow.shadow_stats.error()
+            return
+        agree = int(np.argmax(f.result())) == class_id
+        shadow.shadow_stats.record(agree, primary_seconds, time.perf_counter() - t0)
+
+    fut.add_done_callback(done)
+
+
+def _not_ready_result():
+    return {
+        "ok": False,
+        "class_id": None,
+        "confidence": 0.0,
+        "disease_name": "ยังไม่ได้โหลดโมเดล",
+        "description": "ระบบกำลังทำงานในโหมดทดสอบ (NO-ML)",
+        "advice": "กรุณาติดต่อผู้ดูแลระบบเพื่อตรวจสอบการโหลดโมเดล",
+        "image_url": "",
+        "info_url": ""
+    }
+
+
+def _failed_result():
+    return {
+        "ok": False,
+        "class_id": None,
+        "confidence": 0.0,
+        "disease_name": "ไม่สามารถวิเคราะห์ภาพได้",
+        "description": "อาจเกิดจากไฟล์ภาพเสีย หรือรูปไม่ชัดเจน",
+        "advice": "ลองถ่ายภาพใหม่ให้เห็นใบ/ผลพริกชัด ๆ แล้วส่งอีกครั้ง",
+        "image_url": "",
+        "info_url": ""
+    }
+
+
+def _disease_result(class_id: int, confidence: float):
+    info = DISEASE_INFO.get(
+        class_id,
+        {
+            "name": "ไม่ทราบชนิดโรค",
+            "description": "ไม่พบข้อมูลโรคที่ตรงกับผลวิเคราะห์ในระบบ",
+            "advice": "ลองถ่ายภาพให้ชัดเจนขึ้น หรือปรึกษาเจ้าหน้าที่เกษตรในพื้นที่",
+            "image_url": "",
+            "info_url": "https://www.doa.go.th"
+        }
+    )
+    return {
+        "ok": True,
+        "class_id": class_id,
+        "confidence": confidence,
+        "disease_name": info["name"],
+        "description": info["description"],
+        "advice": info["advice"],
+        "image_url": info["image_url"],
+        "info_url": info["info_url"]
+    }
+
+
+def predict_image(image):
+    """
+    image: path ของไฟล์, bytes ของภาพ (เช่นจาก LINE blob) หรือ file-like object
+
     คืนค่า dict ข้อมูลโรค เช่น:
     {
         "ok": True,
@@ -188,59 +942,98 @@ def predict_image(image_path: str):
         "info_url": "..."
     }
     """
-    if not MODEL_READY or model is None:
-        return {
-            "ok": False,
-            "class_id": None,
-            "confidence": 0.0,
-            "disease_name": "ยังไม่ได้โหลดโมเดล",
-            "description": "ระบบกำลังทำงานในโหมดทดสอบ (NO-ML)",
-            "advice": "กรุณาติดต่อผู้ดูแลระบบเพื่อตรวจสอบการโหลดโมเดล",
-            "image_url": "",
-            "info_url": ""
-        }
+    return predict_images([image])[0]
+
+
+def predict_images(images):
+    """
+    วิเคราะห์หลายภาพพร้อมกัน (เช่นภาพชุดเดียวกันจากผู้ใช้คนเดียว) เป็น batch เดียว
+    คืน list ของ dict แบบเดียวกับ predict_image เรียงตาม input ภาพที่เสียจะได้ ok=False เฉพาะภาพนั้น
+    """
+    # อ่านครั้งเดียว: ถ้ามี hot-swap ระหว่าง request นี้ยังใช้เวอร์ชันเดิมทั้ง engine และ cache
+    active = _active
+    if not MODEL_READY or active is None:
+        return [_not_ready_result() for _ in images]
+
+    cache = active.cache
+    results = [None] * len(images)
+    todo = []  # (index, cache key, decoded image)
+    for i, image in enumerate(images):
+        try:
+            data = _read_bytes(image)
+            img = None
+            key = None
+            if cache is not None:
+                with metrics.stage("cache_lookup"):
+                    key, img = _cache_key(data)
+                    cached = cache.get(key)
+                if cached is not None:
+                    metrics.annotate(cache="hit")
+                    metrics.observe_prediction(cached["class_id"], cached["confidence"])
+                    results[i] = cached
+                    continue
 
+            with metrics.stage("decode"):
+                if img is None:
+                    img = _decode_image(data)
+            todo.append((i, key, img))
+        except Exception as e:
+            print("[ML ERROR] Prediction failed:", e)
+            results[i] = _failed_result()
+
+    if not todo:
+        return results
+
+    # เวลาต่อภาพของโมเดลหลัก (ไม่ใช่ทั้งชุด) ใช้เทียบกับ candidate ที่วัดทีละภาพ
+    primary_seconds = [0.0] * len(todo)
     try:
-        x = _preprocess_image(image_path)
-        preds = model.predict(x)[0]
+        all_preds = _cascade_predict([img for _, _, img in todo], active.engine, primary_seconds)
+    except Exception as e:
+        print("[ML ERROR] Prediction failed:", e)
+        for i, _, _ in todo:
+            results[i] = _failed_result()
+        return results
+
+    shadow = _shadow
+    for (i, key, img), preds, seconds in zip(todo, all_preds, primary_seconds):
         class_id = int(np.argmax(preds))
         confidence = float(np.max(preds) * 100.0)
+        metrics.observe_prediction(class_id, confidence)
 
-        info = DISEASE_INFO.get(
-            class_id,
-            {
-                "name": "ไม่ทราบชนิดโรค",
-                "description": "ไม่พบข้อมูลโรคที่ตรงกับผลวิเคราะห์ในระบบ",
-                "advice": "ลองถ่ายภาพให้ชัดเจนขึ้น หรือปรึกษาเจ้าหน้าที่เกษตรในพื้นที่",
-                "image_url": "",
-                "info_url": "https://www.doa.go.th"
-            }
-        )
+        if shadow is not None and random.random() < ML_SHADOW_SAMPLE:
+            _shadow_compare(shadow, img, class_id, seconds)
 
-        return {
-            "ok": True,
-            "class_id": class_id,
-            "confidence": confidence,
-            "disease_name": info["name"],
-            "description": info["description"],
-            "advice": info["advice"],
-            "image_url": info["image_url"],
-            "info_url": info["info_url"]
-        }
+        result = _disease_result(class_id, confidence)
+        if cache is not None:
+            cache.put(key, result)
+        results[i] = result
+    return results
 
-    except Exception as e:
-        print("[ML ERROR] Prediction failed:", e)
-        return {
-            "ok": False,
-            "class_id": None,
-            "confidence": 0.0,
-            "disease_name": "ไม่สามารถวิเคราะห์ภาพได้",
-            "description": "อาจเกิดจากไฟล์ภาพเสีย หรือรูปไม่ชัดเจน",
-            "advice": "ลองถ่ายภาพใหม่ให้เห็นใบ/ผลพริกชัด ๆ แล้วส่งอีกครั้ง",
-            "image_url": "",
-            "info_url": ""
-        }
 
+def aggregate_predictions(results):
+    """
+    รวมผลหลายภาพของต้นเดียวกันด้วยการโหวตถ่วงน้ำหนักด้วยความมั่นใจ
+
+    คืน dict แบบ predict_image เพิ่ม:
+    - images: จำนวนภาพ, analysed: วิเคราะห์ได้กี่ภาพ, agreeing: กี่ภาพตรงกับโรคที่ชนะ
+    - votes: {class_id: จำนวนภาพ}
+    confidence = ผลรวมความมั่นใจของโรคที่ชนะ / จำนวนภาพที่วิเคราะห์ได้ (ภาพเห็นต่างทำให้ลดลง)
+    """
+    ok = [r for r in results if r.get("ok")]
+    if not ok:
+        failed = dict(results[0]) if results else _failed_result()
+        failed.update({"images": len(results), "analysed": 0, "agreeing": 0, "votes": {}})
+        return failed
+
+    weights = {}
+    votes = {}
+    for r in ok:
+        weights[r["class_id"]] = weights.get(r["class_id"], 0.0) + r["confidence"]
+        votes[r["class_id"]] = votes.get(r["class_id"], 0) + 1
+    winner = max(weights, key=weights.get)
 
-# โหลดโมเดลตั้งแต่ตอน import
-load_ml_model()
+    result = _disease_result(winner, weights[winner] / len(ok))
+    result.update(
+        {"images": len(results), "analysed": len(ok), "agreeing": votes[winner], "votes": votes}
+    )
+    return result
@@ -0,0 +1,227 @@
+"""
+cache ของไฟล์โมเดลที่ดาวน์โหลด + manifest (url/sha256/version)
+
+ตั้ง sha256 ใน manifest จากไฟล์ที่ตรวจแล้ว (เช่นไฟล์เดียวกับที่อัปโหลดขึ้น GitHub Release):
+    python model_artifacts.py pin ChiliDisease7_finetune.keras --version chilli
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    import fcntl
+except ImportError:  # Windows: ไม่มี file lock ข้าม process
+    fcntl = None
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    """
+    manifest (JSON) ระบุ url/sha256/version ของแต่ละไฟล์ เช่น
+    {"ChiliDisease7_finetune.keras": {"url": "...", "sha256": "...", "version": "chilli"}}
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _marker_text(path: str, sha256: str) -> str:
+    st = os.stat(path)
+    return f"{sha256.lower()} {st.st_size} {st.st_mtime_ns}"
+
+
+def _write_marker(path: str, sha256: str):
+    with open(path + ".sha256", "w") as f:
+        f.write(_marker_text(path, sha256))
+
+
+class ArtifactError(Exception):
+    pass
+
+
+class ArtifactManager:
+    """
+    ดาวน์โหลดไฟล์โมเดลลง cache directory แบบปลอดภัย
+
+    - เขียนลง <ไฟล์>.part แล้ว os.replace เมื่อครบและ checksum ถูกต้อง (ไม่มีไฟล์ครึ่ง ๆ)
+    - ถ้าหลุดกลางทาง ต่อจาก .part เดิมด้วย HTTP Range
+    - ตรวจ SHA-256 (ถ้ารู้ค่า) แล้วจดไว้ใน <ไฟล์>.sha256 พร้อมขนาด/mtime ไม่ต้อง hash ซ้ำทุกครั้งที่บูต
+    - ใช้ file lock ให้หลาย worker บนเครื่องเดียวกันดาวน์โหลดแค่ครั้งเดียว
+    """
+
+    def __init__(self, cache_dir: str, retries: int = 3, timeout: float = 60.0, session=None):
+        self.cache_dir = cache_dir
+        self.retries = max(1, int(retries))
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def path_for(self, name: str, version: str = "") -> str:
+        return os.path.join(self.cache_dir, version or "latest", name)
+
+    @contextmanager
+    def _lock(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a+") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def is_valid(self, path: str, sha256: str = "") -> bool:
+        """ไฟล์มีอยู่ และ (ถ้ารู้ sha256) ตรงกับที่คาด"""
+        if not os.path.exists(path):
+            return False
+        if not sha256:
+            return True
+
+        # marker ใช้ได้เฉพาะเมื่อขนาด/mtime ยังตรงกับตอนที่ hash ไว้ ไฟล์ถูกแทนหรือถูกตัด -> hash ใหม่
+        marker = path + ".sha256"
+        if os.path.exists(marker):
+            with open(marker, "r") as f:
+                if f.read().strip() == _marker_text(path, sha256):
+                    return True
+
+        if sha256_file(path) != sha256.lower():
+            return False
+        _write_marker(path, sha256)
+        return True
+
+    def remote_size(self, url: str):
+        """ขนาดไฟล์บน server จาก Content-Length (None ถ้าถามไม่ได้)"""
+        try:
+            r = self.session.head(url, allow_redirects=True, timeout=min(self.timeout, 10.0))
+            r.raise_for_status()
+            length = r.headers.get("Content-Length")
+            return int(length) if length is not None else None
+        except (requests.RequestException, ValueError):
+            return None
+
+    def fetch(self, url: str, name: str, sha256: str = "", version: str = "") -> str:
+        """คืน path ของไฟล์ที่ตรวจแล้ว ดาวน์โหลดเฉพาะเมื่อยังไม่มีใน cache"""
+        final = self.path_for(name, version or (sha256[:12] if sha256 else ""))
+        if self.is_valid(final, sha256):
+            return final
+
+        with self._lock(final):
+            # worker อื่นอาจดาวน์โหลดเสร็จระหว่างที่รอ lock
+            if self.is_valid(final, sha256):
+                return final
+
+            last_error = None
+            for attempt in range(1, self.retries + 1):
+                try:
+                    self._download(url, final + ".part")
+                    break
+                except requests.RequestException as e:
+                    last_error = e
+                    print(f"[ML] Download attempt {attempt}/{self.retries} failed: {e}")
+                    time.sleep(min(2 ** attempt, 10))
+            else:
+                raise ArtifactError(f"download failed: {last_error}")
+
+            part = final + ".part"
+            if sha256:
+                actual = sha256_file(part)
+                if actual != sha256.lower():
+                    os.remove(part)
+                    raise ArtifactError(f"sha256 mismatch for {name}: {actual}")
+
+            os.replace(part, final)
+            if sha256:
+                _write_marker(final, sha256)
+            return final
+
+    def _download(self, url: str, part: str):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, stream=True, timeout=self.timeout, headers=headers) as r:
+            if r.status_code == 416:
+                # .part ครบแล้ว (หรือเกิน) ให้ checksum เป็นตัวตัดสิน
+                return
+            r.raise_for_status()
+
+            if offset and r.status_code != 206:
+                # server ไม่รองรับ Range: เริ่มใหม่
+                offset = 0
+            mode = "ab" if offset else "wb"
+            if offset:
+                print(f"[ML] Resuming download at {offset / (1024 * 1024):.2f} MB")
+
+            total = offset
+            with open(part, mode) as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        total += len(chunk)
+
+            expected = r.headers.get("Content-Length")
+            if expected is not None and total - offset < int(expected):
+                raise requests.ConnectionError(
+                    f"incomplete download: {total - offset} of {expected} bytes"
+                )
+
+        print(f"[ML] Downloaded {total / (1024 * 1024):.2f} MB")
+
+
+def pin(manifest_path: str, path: str, url: str = "", version: str = "") -> dict:
+    """คำนวณ sha256 ของไฟล์แล้วบันทึกลง manifest (เขียนทับทั้งไฟล์แบบ atomic)"""
+    manifest = load_manifest(manifest_path)
+    name = os.path.basename(path)
+    entry = manifest.get(name, {})
+    entry["sha256"] = sha256_file(path)
+    if url:
+        entry["url"] = url
+    if version:
+        entry["version"] = version
+    manifest[name] = entry
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, manifest_path)
+    return entry
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Manage the model artifact manifest")
+    ap.add_argument("--manifest", default=os.getenv("ML_MODEL_MANIFEST", "model_manifest.json"))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("pin", help="record the sha256 of a local model file in the manifest")
+    p.add_argument("path")
+    p.add_argument("--url", default="")
+    p.add_argument("--version", default="")
+
+    args = ap.parse_args(argv)
+    if args.cmd == "pin":
+        entry = pin(args.manifest, args.path, args.url, args.version)
+        print(f"[ML] Pinned {os.path.basename(args.path)} sha256 {entry['sha256']} in {args.manifest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
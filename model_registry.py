@@ -0,0 +1,147 @@
+"""
+registry ของไฟล์โมเดลแบบมีเวอร์ชัน: <root>/<version>/<ไฟล์> + <root>/registry.json
+
+registry.json:
+    {"active": "v2",
+     "versions": {"v2": {"file": "v2/ChiliDisease7_finetune.keras", "backend": "keras",
+                         "sha256": "...", "created": 1700000000, "note": ""}}}
+
+ตัวอย่าง:
+    python model_registry.py register new_model.keras --version v2 --note "retrained"
+    python model_registry.py list
+    python model_registry.py promote v2     # บอทที่เปิด ML_RELOAD_WATCH จะสลับไปใช้เอง
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from model_artifacts import sha256_file
+
+REGISTRY_FILE = "registry.json"
+
+
+def backend_for_path(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return {".tflite": "tflite", ".onnx": "onnx"}.get(ext, "keras")
+
+
+class ModelRegistry:
+    def __init__(self, root: str):
+        self.root = root
+        self.index_path = os.path.join(root, REGISTRY_FILE)
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {"active": "", "versions": {}}
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data.setdefault("active", "")
+        data.setdefault("versions", {})
+        return data
+
+    def _write(self, data: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        # ผู้อ่าน (watcher) เห็นไฟล์เก่าหรือใหม่ทั้งไฟล์ ไม่มีครึ่ง ๆ
+        os.replace(tmp, self.index_path)
+
+    def mtime(self) -> float:
+        try:
+            return os.stat(self.index_path).st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def versions(self) -> dict:
+        return self._read()["versions"]
+
+    def active(self) -> str:
+        return self._read()["active"]
+
+    def get(self, version: str):
+        """คืน dict ของเวอร์ชัน (มี path เต็ม) หรือ None"""
+        entry = self._read()["versions"].get(version)
+        if entry is None:
+            return None
+        return {**entry, "version": version, "path": os.path.join(self.root, entry["file"])}
+
+    def register(self, src: str, version: str, backend: str = "", note: str = "", activate: bool = False):
+        """คัดลอกไฟล์เข้า registry (ผ่าน .part แล้ว os.replace) และบันทึก sha256"""
+        with self._lock:
+            data = self._read()
+            if version in data["versions"]:
+                raise ValueError(f"version '{version}' already registered")
+
+            rel = os.path.join(version, os.path.basename(src))
+            dest = os.path.join(self.root, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(src, dest + ".part")
+            os.replace(dest + ".part", dest)
+
+            data["versions"][version] = {
+                "file": rel,
+                "backend": backend or backend_for_path(src),
+                "sha256": sha256_file(dest),
+                "created": int(time.time()),
+                "note": note,
+            }
+            if activate or not data["active"]:
+                data["active"] = version
+            self._write(data)
+            return self.get(version)
+
+    def promote(self, version: str):
+        with self._lock:
+            data = self._read()
+            if version not in data["versions"]:
+                raise KeyError(version)
+            data["active"] = version
+            self._write(data)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Manage versioned model artifacts")
+    ap.add_argument("--root", default=os.getenv("ML_REGISTRY_DIR", "model_registry"))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    reg = sub.add_parser("register", help="copy a model file into the registry")
+    reg.add_argument("path")
+    reg.add_argument("--version", required=True)
+    reg.add_argument("--backend", default="")
+    reg.add_argument("--note", default="")
+    reg.add_argument("--activate", action="store_true")
+
+    sub.add_parser("list", help="list registered versions")
+
+    pro = sub.add_parser("promote", help="make a version the active one")
+    pro.add_argument("version")
+
+    args = ap.parse_args(argv)
+    registry = ModelRegistry(args.root)
+
+    if args.cmd == "register":
+        entry = registry.register(args.path, args.version, args.backend, args.note, args.activate)
+        print(f"[REGISTRY] Registered {entry['version']} ({entry['backend']}, sha256 {entry['sha256'][:12]})")
+    elif args.cmd == "list":
+        active = registry.active()
+        for version, entry in sorted(registry.versions().items(), key=lambda kv: kv[1]["created"]):
+            mark = "*" if version == active else " "
+            print(f"{mark} {version:<16} {entry['backend']:<7} {entry['sha256'][:12]}  {entry['note']}")
+    elif args.cmd == "promote":
+        try:
+            registry.promote(args.version)
+        except KeyError:
+            print(f"[REGISTRY] Unknown version '{args.version}'")
+            return 1
+        print(f"[REGISTRY] Active version -> {args.version}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
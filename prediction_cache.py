@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def content_key(data: bytes) -> str:
+    """key จากเนื้อไฟล์ (ภาพเดิมทุก byte เท่านั้นที่ hit)"""
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def perceptual_key(img: Image.Image, hash_size: int = 8) -> str:
+    """
+    dHash 64 บิต: ภาพเดียวกันที่ถูกบีบอัด/ส่งต่อใหม่ (re-encode) จะได้ key เดียวกัน
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return f"dhash:{bits:0{hash_size * hash_size // 4}x}"
+
+
+class PredictionCache:
+    """
+    cache ผลวิเคราะห์ภาพ: LRU ในหน่วยความจำ + TTL + (ถ้ากำหนด path) เก็บลง SQLite
+
+    - max_entries: จำนวนผลสูงสุดในหน่วยความจำ
+    - ttl: อายุของผล (วินาที) 0 = ไม่หมดอายุ
+    - path: ไฟล์ SQLite สำหรับเก็บข้ามการรีสตาร์ท (None = ไม่ใช้ดิสก์)
+    - version: เวอร์ชันโมเดล ใส่ไว้ใน key เพื่อให้ผลเก่าใช้ไม่ได้เมื่อเปลี่ยนโมเดล
+    - max_disk_entries: จำนวนแถวสูงสุดใน SQLite (ลบแถวเก่าสุดก่อน รวมถึงผลของโมเดลเวอร์ชันเก่า)
+    - purge_every: ลบแถวหมดอายุ/เกินจำนวนทุก ๆ purge_every ครั้งที่ put
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400.0, path=None, version: str = "",
+                 max_disk_entries: int = 100000, purge_every: int = 1000):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.path = path
+        self.version = version
+        self.max_disk_entries = max(0, int(max_disk_entries))
+        self.purge_every = max(1, int(purge_every))
+
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS predictions_created ON predictions (created)")
+        self._purge_disk()
+
+    def _purge_disk(self):
+        if self._db is None:
+            return
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM predictions WHERE created < ?", (time.time() - self.ttl,))
+        if self.max_disk_entries > 0:
+            # ttl=0 ก็ไม่โตไม่จำกัด: เก็บไว้แค่ max_disk_entries แถวล่าสุด
+            self._db.execute(
+                "DELETE FROM predictions WHERE key IN ("
+                " SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+
+    def _full_key(self, key: str) -> str:
+        return f"{self.version}|{key}"
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and (time.time() - created) > self.ttl
+
+    def get(self, key: str):
+        k = self._full_key(key)
+        with self._lock:
+            item = self._mem.get(k)
+            if item is not None:
+                created, value = item
+                if not self._expired(created):
+                    self._mem.move_to_end(k)
+                    self.hits += 1
+                    return dict(value)
+                del self._mem[k]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM predictions WHERE key = ?", (k,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = json.loads(row[0])
+                    self._remember(k, row[1], value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return dict(value)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: dict):
+        k = self._full_key(key)
+        now = time.time()
+        with self._lock:
+            self._remember(k, now, dict(value))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, value, created) VALUES (?, ?, ?)",
+                    (k, json.dumps(value, ensure_ascii=False), now),
+                )
+                self._puts += 1
+                if self._puts % self.purge_every == 0:
+                    self._purge_disk()
+
+    def _remember(self, k, created, value):
+        self._mem[k] = (created, value)
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+
+    def close(self):
+        """ปิด connection ของ SQLite (ตอนเลิกใช้โมเดลเวอร์ชันนี้) หลังจากนี้ใช้แค่ในหน่วยความจำ"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "version": self.version,
+            }
@@ -0,0 +1,305 @@
+"""
+ตอบคำถามข้อความ (อาการ / วิธีรักษา) จาก DISEASE_INFO ใน process ไม่ต้องเรียก LLM ภายนอก
+
+- ตัดคำไทยด้วย trie ของคำศัพท์โรค/อาการ (longest match) + character trigram
+  (ครอบคลุมคำที่ไม่อยู่ในพจนานุกรม และพิมพ์ผิด/ไม่ใส่วรรณยุกต์)
+- index แบบ inverted TF-IDF สร้างครั้งเดียวตอน startup: term -> ((class_id, weight), ...)
+- match() ใช้เวลาระดับไมโครวินาที (ดู benchmarks/intent_bench.py)
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+# คำบอกบริบท (ส่วนของต้น สภาพแวดล้อม สี) ใช้ให้คะแนนได้ แต่อย่างเดียวไม่พอจะตอบว่าเป็นโรค
+# เช่น "พรุ่งนี้ฝนจะตกไหม" / "กี่วันถึงเก็บผลได้" ไม่ใช่คำถามเรื่องโรค
+CONTEXT_WORDS = (
+    "พริก", "ใบ", "ผล", "ต้น", "ราก", "โคน", "ยอด", "ขอบใบ", "กิ่ง", "ดอก",
+    "สีส้ม", "สีดำ", "สีน้ำตาล", "สีขาว", "เหลือง", "แห้ง", "ผง", "รา", "แมลง",
+    "ชื้น", "แฉะ", "ฝน", "น้ำขัง",
+)
+# คำอาการ/เชื้อ/ชื่อโรค (เพิ่มจากชื่อโรคใน DISEASE_INFO ที่แยกอัตโนมัติ)
+# คำถามต้องมีอย่างน้อย 1 คำในกลุ่มนี้จึงจะตอบเป็นโรค
+SIGN_WORDS = (
+    "จุด", "ใบจุด", "จุดสีน้ำตาล", "วงแหวน", "ไหม้", "ใบไหม้", "กุ้งแห้ง", "เหี่ยว",
+    "เน่า", "ผลเน่า", "รากเน่า", "โคนเน่า", "แผล", "แผลบุ๋ม", "สปอร์",
+    "ผงสีขาว", "แป้ง", "ราแป้ง", "ขึ้นรา", "ใบเหลือง", "ด่าง", "ใบด่าง",
+    "หงิก", "ใบหงิก", "ม้วน", "งอ", "บิดงอ", "แคระ", "แคระแกร็น", "ร่วง", "ใบร่วง",
+    "เชื้อรา", "ไวรัส", "แบคทีเรีย", "เพลี้ย", "เพลี้ยอ่อน", "แมลงหวี่ขาว", "หวี่ขาว", "แอนแทรคโนส",
+)
+
+TREATMENT_WORDS = (
+    "รักษา", "วิธีรักษา", "แก้", "แก้ไข", "กำจัด", "ป้องกัน", "ยา", "พ่น", "สาร", "สารเคมี",
+    "ทำยังไง", "ทำไง", "ทำอย่างไร", "ควรทำ", "จัดการ", "ไตรโคเดอร์มา",
+)
+SYMPTOM_WORDS = (
+    "อาการ", "ลักษณะ", "สังเกต", "เป็นยังไง", "เป็นอย่างไร", "คืออะไร", "สาเหตุ", "เกิดจาก",
+)
+# คำทั่วไปที่ขึ้นต้นเหมือนคำศัพท์โรค (เช่น ราคา -> รา, ยาว -> ยา) ใส่ใน trie ให้ตัดคำถูก แต่ไม่ใช้ให้คะแนน
+GENERAL_WORDS = (
+    "ราคา", "รายการ", "ราย", "ผลผลิต", "ผลไม้", "ต้นทุน", "ใบเสร็จ", "ยาว", "สารพัด",
+)
+# คำเสริมที่พอตัดวรรณยุกต์แล้วตรงกับคำอาการ (ไหม -> ไหม้) คำอาการนั้นต้องสะกดตรงจึงนับ
+PARTICLE_WORDS = ("ไหม", "ไม่", "ได้", "ให้", "นี้", "ก็")
+GREETING_WORDS = ("สวัสดี", "หวัดดี", "ดีครับ", "ดีค่ะ", "hello", "hi")
+THANKS_WORDS = ("ขอบคุณ", "ขอบใจ", "thank", "thanks")
+HELP_WORDS = ("วิธีใช้", "ใช้ยังไง", "ใช้งาน", "เมนู", "ช่วยด้วย", "help")
+
+# intent
+INTENT_DISEASE = "disease"
+INTENT_GREETING = "greeting"
+INTENT_THANKS = "thanks"
+INTENT_HELP = "help"
+INTENT_UNKNOWN = "unknown"
+
+# ชนิดคำตอบของ INTENT_DISEASE
+ASPECT_TREATMENT = "treatment"
+ASPECT_SYMPTOM = "symptom"
+ASPECT_OVERVIEW = "overview"
+
+_TONE_MARKS = re.compile("[่-์]")  # ่ ้ ๊ ๋ ์
+_REPEAT = re.compile(r"(.)\1{2,}")
+_LATIN = re.compile(r"[a-z0-9]+")
+_NAME_SPLIT = re.compile(r"[\s/()\-–,]+")
+
+
+def normalize(text: str) -> str:
+    """ตัวเล็ก ตัดวรรณยุกต์/การันต์ และตัวอักษรที่พิมพ์ซ้ำ (เช่น ค่าาาา) ให้ค้นได้แม้พิมพ์ไม่ตรง"""
+    text = _TONE_MARKS.sub("", text.lower())
+    return _REPEAT.sub(r"\1", text)
+
+
+class _Trie:
+    """trie ของคำศัพท์ (เก็บเป็น dict ซ้อน) ใช้ตัดคำแบบ longest match"""
+
+    _END = ""
+
+    def __init__(self, words=()):
+        self.root = {}
+        for w in words:
+            self.add(w)
+
+    def add(self, word: str):
+        if not word:
+            return
+        node = self.root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[self._END] = word
+
+    def tokenize(self, text: str):
+        """คืนคำในพจนานุกรมที่เจอ (longest match จากซ้ายไปขวา ข้ามตัวอักษรที่ไม่รู้จัก)"""
+        tokens = []
+        i, n = 0, len(text)
+        end = self._END
+        while i < n:
+            node = self.root
+            match = None
+            j = i
+            while j < n:
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+                if end in node:
+                    match = (node[end], j)
+            if match is None:
+                i += 1
+            else:
+                tokens.append(match[0])
+                i = match[1]
+        return tokens
+
+
+class IntentMatch:
+    __slots__ = ("intent", "aspect", "class_id", "score", "alternatives")
+
+    def __init__(self, intent, aspect=None, class_id=None, score=0.0, alternatives=()):
+        self.intent = intent
+        self.aspect = aspect
+        self.class_id = class_id
+        self.score = score
+        self.alternatives = alternatives
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent}, {self.aspect}, class_id={self.class_id}, score={self.score:.3f})"
+
+
+class IntentEngine:
+    """
+    index ข้อความของแต่ละโรค (ชื่อ x3 + อาการ + คำแนะนำ) แล้วจับคู่คำถามกับโรคที่ใกล้สุด
+
+    - ตอบเป็นโรคเฉพาะคำถามที่มีคำอาการ/ชื่อโรค (SIGN_WORDS) อย่างน้อย 1 คำ
+      คำบริบทอย่าง พริก / ใบ / ผล / ฝน หรือ trigram ที่บังเอิญตรง ไม่พอ
+    - min_score: คะแนน (cosine) ต่ำสุดของโรคที่ตรงที่สุด
+    - ambiguity: ถ้าอันดับ 2 ได้คะแนน >= ambiguity * อันดับ 1 จะถือว่ากำกวม (ถามกลับ/แนะนำส่งรูป)
+    """
+
+    def __init__(self, disease_info: dict, min_score: float = 0.08, ambiguity: float = 0.85,
+                 word_boost: float = 3.0):
+        self.info = disease_info
+        self.min_score = min_score
+        self.ambiguity = ambiguity
+        self.word_boost = word_boost
+
+        signs = set(SIGN_WORDS)
+        for entry in disease_info.values():
+            for part in _NAME_SPLIT.split(entry["name"]):
+                if len(part) > 1:
+                    signs.add(part)
+                    if part.startswith("โรค") and len(part) > 4:
+                        signs.add(part[3:])
+        signs -= set(CONTEXT_WORDS)
+        self._sign_words = frozenset(normalize(w) for w in signs)
+        particles = {normalize(w) for w in PARTICLE_WORDS}
+        # normalize แล้ว -> คำที่สะกดถูก (เฉพาะคำที่ชนกับคำเสริม)
+        self._exact_signs = {normalize(w): w for w in signs if normalize(w) in particles}
+        self._intent_words = {
+            ASPECT_TREATMENT: frozenset(normalize(w) for w in TREATMENT_WORDS),
+            ASPECT_SYMPTOM: frozenset(normalize(w) for w in SYMPTOM_WORDS),
+            INTENT_GREETING: frozenset(normalize(w) for w in GREETING_WORDS),
+            INTENT_THANKS: frozenset(normalize(w) for w in THANKS_WORDS),
+            INTENT_HELP: frozenset(normalize(w) for w in HELP_WORDS),
+        }
+        words = self._sign_words | {normalize(w) for w in CONTEXT_WORDS}
+        for group in self._intent_words.values():
+            words |= group
+        general = {normalize(w) for w in GENERAL_WORDS}
+        self._trie = _Trie(words | general)
+        # คำบอกเจตนา (รักษา/อาการ/ทักทาย) และคำทั่วไป ไม่ใช้ในการเลือกโรค
+        self._stopwords = frozenset(general).union(*self._intent_words.values())
+
+        self._build_index()
+
+    # ===== tokenize =====
+    def _terms(self, text: str, drop=frozenset()) -> Counter:
+        norm = normalize(text)
+        words = [w for w in self._trie.tokenize(norm) if w not in self._stopwords and w not in drop]
+        words += [w for w in _LATIN.findall(norm) if w not in self._stopwords]
+        compact = "".join(ch for ch in norm if not ch.isspace() and ch not in ".,!?")
+        terms = Counter("w:" + w for w in words)
+        for i in range(len(compact) - 2):
+            terms["g:" + compact[i:i + 3]] += 1
+        return terms
+
+    # ===== index =====
+    def _build_index(self):
+        docs = {}
+        for class_id, entry in self.info.items():
+            text = " ".join([entry["name"]] * 3 + [entry["description"], entry["advice"]])
+            docs[class_id] = self._terms(text)
+
+        n_docs = len(docs)
+        df = Counter()
+        for terms in docs.values():
+            df.update(terms.keys())
+        self._idf = {t: math.log((1 + n_docs) / (1 + c)) + 1.0 for t, c in df.items()}
+
+        postings = defaultdict(list)
+        for class_id, terms in docs.items():
+            weights = {t: (1.0 + math.log(tf)) * self._idf[t] for t, tf in terms.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for t, w in weights.items():
+                postings[t].append((class_id, w / norm))
+        # เก็บเป็น tuple (เล็กกว่า list และไม่ถูกแก้ระหว่างใช้งาน)
+        self._postings = {t: tuple(p) for t, p in postings.items()}
+
+    def index_stats(self) -> dict:
+        return {
+            "documents": len(self.info),
+            "terms": len(self._postings),
+            "postings": sum(len(p) for p in self._postings.values()),
+            "lexicon_words": sum(1 for _ in self._iter_words(self._trie.root)),
+        }
+
+    @staticmethod
+    def _iter_words(node):
+        stack = [node]
+        while stack:
+            cur = stack.pop()
+            for key, child in cur.items():
+                if key == _Trie._END:
+                    yield child
+                else:
+                    stack.append(child)
+
+    # ===== query =====
+    def match(self, text: str) -> IntentMatch:
+        norm = normalize(text)
+        found = set(self._trie.tokenize(norm)) | set(_LATIN.findall(norm))
+        lowered = text.lower()
+        drop = {w for w, exact in self._exact_signs.items() if w in found and exact not in lowered}
+        found -= drop
+
+        scores = defaultdict(float)
+        q_norm = 0.0
+        # ไม่มีคำอาการ/ชื่อโรคเลย ไม่ต้องให้คะแนน (ไปดูทักทาย/ขอบคุณ/วิธีใช้)
+        terms = self._terms(text, drop).items() if found & self._sign_words else ()
+        for term, tf in terms:
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            is_word = term[0] == "w"
+            w = (1.0 + math.log(tf)) * idf * (self.word_boost if is_word else 1.0)
+            q_norm += w * w
+            for class_id, dw in self._postings[term]:
+                scores[class_id] += w * dw
+
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        if ranked and q_norm:
+            q_norm = math.sqrt(q_norm)
+            ranked = [(c, s / q_norm) for c, s in ranked]
+
+        if ranked and ranked[0][1] >= self.min_score:
+            best, score = ranked[0]
+            alternatives = tuple(
+                c for c, s in ranked[1:3] if s >= self.ambiguity * score
+            )
+            if found & self._intent_words[ASPECT_TREATMENT]:
+                aspect = ASPECT_TREATMENT
+            elif found & self._intent_words[ASPECT_SYMPTOM]:
+                aspect = ASPECT_SYMPTOM
+            else:
+                aspect = ASPECT_OVERVIEW
+            return IntentMatch(INTENT_DISEASE, aspect, best, score, alternatives)
+
+        for intent in (INTENT_GREETING, INTENT_THANKS, INTENT_HELP):
+            if found & self._intent_words[intent]:
+                return IntentMatch(intent)
+        return IntentMatch(INTENT_UNKNOWN, score=ranked[0][1] if ranked else 0.0)
+
+    # ===== reply =====
+    def respond(self, text: str) -> str:
+        return self.respond_to(self.match(text))
+
+    def respond_to(self, m: IntentMatch) -> str:
+        if m.intent == INTENT_GREETING:
+            return "สวัสดีค่ะ 🌶️ ส่งรูปใบหรือผลพริกมาให้วิเคราะห์โรค หรือพิมพ์อาการที่พบเพื่อรับคำแนะนำได้เลยค่ะ"
+        if m.intent == INTENT_THANKS:
+            return "ยินดีค่ะ 🌶️ ถ้ามีอาการผิดปกติเพิ่มเติม ส่งรูปมาได้ตลอดนะคะ"
+        if m.intent == INTENT_HELP:
+            return (
+                "วิธีใช้งาน:\n"
+                "• ส่งรูปใบ/ผลพริกที่ชัด ๆ เพื่อวิเคราะห์โรค\n"
+                "• พิมพ์อาการ เช่น \"ใบพริกมีจุดสีน้ำตาล\" หรือ \"ราแป้งรักษายังไง\""
+            )
+        if m.intent == INTENT_UNKNOWN:
+            return (
+                "ขออภัยค่ะ ยังไม่เข้าใจคำถาม ลองพิมพ์อาการที่พบ เช่น \"ใบหงิกเหลือง\" "
+                "หรือส่งรูปพริกมาให้วิเคราะห์ได้เลยค่ะ"
+            )
+
+        entry = self.info[m.class_id]
+        if m.alternatives:
+            names = "\n".join(f"• {self.info[c]['name']}" for c in (m.class_id,) + m.alternatives)
+            return (
+                f"อาการนี้อาจเป็นได้หลายโรค:\n{names}\n\n"
+                "ส่งรูปใบหรือผลพริกมาเพื่อให้ระบบวิเคราะห์ได้แม่นยำขึ้นค่ะ"
+            )
+        if m.aspect == ASPECT_TREATMENT:
+            return f"✅ วิธีจัดการ{entry['name']}:\n{entry['advice']}\n\nอ่านเพิ่มเติม: {entry['info_url']}"
+        if m.aspect == ASPECT_SYMPTOM:
+            return f"🔍 {entry['name']}\nอาการ: {entry['description']}"
+        return (
+            f"🔍 น่าจะเป็น{entry['name']}\n{entry['description']}\n\n"
+            f"✅ คำแนะนำ:\n{entry['advice']}"
+        )